@@ -0,0 +1,201 @@
+import bisect
+import itertools
+import math
+import os
+import threading
+import time
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0   # image analysis, /clarify, /chat
+PRIORITY_VIDEO = 1
+
+DEFAULT_LIMITS = {
+    "image": int(os.getenv("ADMISSION_IMAGE_CONCURRENCY", "8")),
+    "chat": int(os.getenv("ADMISSION_CHAT_CONCURRENCY", "8")),
+    "video": int(os.getenv("ADMISSION_VIDEO_CONCURRENCY", "2")),
+}
+# Latency target per route class; requests that cannot finish in time are rejected
+DEFAULT_SLO_SECONDS = {
+    "image": float(os.getenv("ADMISSION_IMAGE_SLO_SECONDS", "20")),
+    "chat": float(os.getenv("ADMISSION_CHAT_SLO_SECONDS", "15")),
+    "video": float(os.getenv("ADMISSION_VIDEO_SLO_SECONDS", "90")),
+}
+# Initial service-time guesses until real measurements arrive
+DEFAULT_SERVICE_SECONDS = {"image": 4.0, "chat": 2.0, "video": 20.0}
+
+TOTAL_LIMIT = int(os.getenv("ADMISSION_TOTAL_CONCURRENCY", "12"))
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Weight of the newest sample in the service-time moving average
+_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    "Raised when a request is shed; `retry_after` is a hint in seconds."
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, route: str, priority: int, seq: int):
+        self.route = route
+        self.priority = priority
+        self.seq = seq
+        self.state = "waiting"   # waiting | admitted | shed
+
+    def sort_key(self):
+        return (self.priority, self.seq)
+
+
+class AdmissionController:
+    """
+    Per-route concurrency limits plus a shared, bounded priority queue.
+    - A request runs when both its route and the total limit have room
+    - Waiting requests are admitted in priority order, so image and chat
+      requests take freed slots ahead of video
+    - Requests are rejected up front when the estimated queue wait would
+      blow the route's SLO, and time out after the queue deadline
+    - When the queue is full, a higher-priority arrival sheds the
+      lowest-priority waiter
+    """
+
+    def __init__(
+        self,
+        limits: dict = None,
+        slo_seconds: dict = None,
+        total_limit: int = TOTAL_LIMIT,
+        max_queue: int = MAX_QUEUE,
+        queue_timeout: float = QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.limits = dict(limits or DEFAULT_LIMITS)
+        self.slo_seconds = dict(slo_seconds or DEFAULT_SLO_SECONDS)
+        self.total_limit = total_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._queue = []   # waiters sorted by (priority, seq)
+        self._active = {route: 0 for route in self.limits}
+        self._service = {
+            route: DEFAULT_SERVICE_SECONDS.get(route, 5.0) for route in self.limits
+        }
+        self._stats = {
+            route: {"admitted": 0, "rejected": 0, "timed_out": 0, "shed": 0}
+            for route in self.limits
+        }
+
+    def _total_active(self) -> int:
+        return sum(self._active.values())
+
+    def _has_room(self, route: str) -> bool:
+        return (
+            self._active[route] < self.limits[route]
+            and self._total_active() < self.total_limit
+        )
+
+    def _estimated_wait(self, route: str) -> float:
+        # Caller holds the lock
+        if self._has_room(route):
+            return 0.0
+        ahead = sum(1 for w in self._queue if w.route == route)
+        return (ahead + 1) / self.limits[route] * self._service[route]
+
+    def _dispatch(self) -> None:
+        # Caller holds the lock: admit waiters in priority order while there is room
+        admitted = False
+        for waiter in list(self._queue):
+            if self._total_active() >= self.total_limit:
+                break
+            if self._active[waiter.route] < self.limits[waiter.route]:
+                self._queue.remove(waiter)
+                waiter.state = "admitted"
+                self._active[waiter.route] += 1
+                admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def _reject(self, route: str, reason: str, wait: float, counter: str = "rejected"):
+        self._stats[route][counter] += 1
+        raise Overloaded(reason, retry_after=max(1, math.ceil(wait)))
+
+    def acquire(self, route: str, priority: int) -> None:
+        "Block until admitted; raises Overloaded if the request is shed."
+        with self._cond:
+            waiting_same_route = any(w.route == route for w in self._queue)
+            if not waiting_same_route and self._has_room(route):
+                self._active[route] += 1
+                self._stats[route]["admitted"] += 1
+                return
+
+            wait = self._estimated_wait(route)
+            if wait + self._service[route] > self.slo_seconds[route]:
+                self._reject(route, "Estimated wait exceeds latency target", wait)
+
+            if len(self._queue) >= self.max_queue:
+                worst = self._queue[-1]
+                if worst.priority <= priority:
+                    self._reject(route, "Admission queue is full", wait)
+                # Make room by shedding the lowest-priority waiter
+                self._queue.pop()
+                worst.state = "shed"
+                self._stats[worst.route]["shed"] += 1
+                self._cond.notify_all()
+
+            waiter = _Waiter(route, priority, next(self._seq))
+            keys = [w.sort_key() for w in self._queue]
+            self._queue.insert(bisect.bisect(keys, waiter.sort_key()), waiter)
+
+            deadline = time.monotonic() + self.queue_timeout
+            while waiter.state == "waiting":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(waiter)
+                    self._reject(
+                        route, "Timed out waiting for capacity",
+                        self._estimated_wait(route), counter="timed_out",
+                    )
+                self._cond.wait(remaining)
+
+            if waiter.state == "shed":
+                raise Overloaded(
+                    "Shed for higher-priority requests",
+                    retry_after=max(1, math.ceil(self._service[route])),
+                )
+            self._stats[route]["admitted"] += 1
+
+    def release(self, route: str, elapsed: float = None) -> None:
+        "Free the slot; `elapsed` (seconds) updates the service-time estimate."
+        with self._cond:
+            self._active[route] = max(0, self._active[route] - 1)
+            if elapsed is not None:
+                self._service[route] = (
+                    (1 - _EWMA_ALPHA) * self._service[route] + _EWMA_ALPHA * elapsed
+                )
+            self._dispatch()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "total_active": self._total_active(),
+                "total_limit": self.total_limit,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "routes": {
+                    route: {
+                        "active": self._active[route],
+                        "limit": self.limits[route],
+                        "queued": sum(1 for w in self._queue if w.route == route),
+                        "service_seconds": round(self._service[route], 3),
+                        "slo_seconds": self.slo_seconds[route],
+                        **self._stats[route],
+                    }
+                    for route in self.limits
+                },
+            }
+
+
+ADMISSION = AdmissionController()
@@ -2,6 +2,8 @@ import re
 from collections import defaultdict
 from typing import Any, Dict, List, Tuple
 
+from detections import DetectedObject
+
 # Simple pronouns (to be extended)
 PRONOUN_PATTERNS = [
     r"\bit\b",
@@ -42,35 +44,23 @@ def _has_any_pattern(text: str, patterns: List[str]) -> bool:
             return True
     return False
 
-def _summarize_obj(obj: Dict[str, Any], idx_fallback: int) -> str:
+def _summarize_obj(obj: DetectedObject) -> str:
     """
     Produce a short human-readable label for clarifying options.
     """
-    obj_id = obj.get("id", idx_fallback)
-    name = obj.get("name", "object")
-    color = obj.get("color", None)
-    pos = obj.get("position", None)
-
-    parts = [f"{name} #{obj_id}"]
-    meta = []
-    if color and str(color).lower() != "none":
-        meta.append(str(color))
-    if pos and str(pos).lower() != "unknown":
-        meta.append(str(pos))
+    parts = [f"{obj.name} #{obj.id}"]
+    meta = [m for m in (obj.color, obj.position) if m]
     if meta:
         parts.append(f"({', '.join(meta)})")
     return " ".join(parts)
 
-def _group_by_name(objects: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+def _group_by_name(objects: List[DetectedObject]) -> Dict[str, List[DetectedObject]]:
     groups = defaultdict(list)
     for obj in objects:
-        name = _norm(obj.get("name", "object"))
-        if not name:
-            name = "object"
-        groups[name].append(obj)
+        groups[obj.key].append(obj)
     return dict(groups)
 
-def detect_ambiguity(question: str, objects: List[Dict[str, Any]]) -> Dict[str, Any]:
+def detect_ambiguity(question: str, objects: List[DetectedObject]) -> Dict[str, Any]:
     """
     Rule-based ambiguity detector.
 
@@ -79,12 +69,14 @@ def detect_ambiguity(question: str, objects: List[Dict[str, Any]]) -> Dict[str,
       "is_ambiguous": bool,
       "reasons": [str],
       "clarifying_question": str or None,
-      "options": [str]  # human-readable options for the user
+      "options": [str],  # human-readable options for the user
+      "option_indices": [int]  # index into `objects` for each option
     }
     """
     q = _norm(question)
     reasons: List[str] = []
     options: List[str] = []
+    option_indices: List[int] = []
     clarifying_question = None
 
     # Pronouns
@@ -120,13 +112,14 @@ def detect_ambiguity(question: str, objects: List[Dict[str, Any]]) -> Dict[str,
         # If multiple groups exist, pick the largest one
         if len(multi_same_type) > 0:
             target_name, _ = sorted(multi_same_type, key=lambda x: x[1], reverse=True)[0]
-            target_objs = groups.get(target_name, [])
-            options = [_summarize_obj(o, i + 1) for i, o in enumerate(target_objs)]
+            option_indices = [i for i, o in enumerate(objects) if o.key == target_name]
+            options = [_summarize_obj(objects[i]) for i in option_indices]
             clarifying_question = f"I see multiple {target_name}s. Which one do you mean?"
         else:
             # Only pronouns without a multi-object class
             # -> Return a generalized clarifying question
-            options = [_summarize_obj(o, i + 1) for i, o in enumerate(objects[:6])]
+            option_indices = list(range(min(len(objects), 6)))
+            options = [_summarize_obj(objects[i]) for i in option_indices]
             clarifying_question = "Which object are you referring to?"
 
         # Preserve ambiguity even if the question already contains referential hints
@@ -139,5 +132,6 @@ def detect_ambiguity(question: str, objects: List[Dict[str, Any]]) -> Dict[str,
         "reasons": reasons,
         "clarifying_question": clarifying_question,
         "options": options,
+        "option_indices": option_indices,
         "multi_object_groups": multi_object_groups,
     }
@@ -1,33 +1,100 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import uuid
+import copy
 import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
-from video_processor import extract_frames
-from temporal_aggregator import aggregate_temporal_objects
+from temporal_aggregator import (
+    aggregate_temporal_objects,
+    TemporalAggregator,
+    timestamp_seconds,
+)
 from temporal_ambiguity import detect_temporal_ambiguity
-from openai_vision import analyze_image_to_objects
+from openai_vision import analyze_image_to_objects, stream_image_objects, DEFAULT_MODEL
+from vision_cascade import analyze_with_cascade, cascade_applies, cascade_metrics
 from ambiguity import detect_ambiguity
-from response_generator import generate_onepass_response
+from selection_resolver import build_resolver
+from response_generator import (
+    generate_onepass_response,
+    format_object_details,
+    format_temporal_line,
+)
 from llm_answer import generate_natural_answer
+from prompt_builder import prompt_cache_metrics
 from session_store import (
     create_session,
     get_session,
     end_session,
     set_focus_object,
     append_history,
+    on_session_evicted,
+)
+from detections import to_jsonable
+import single_flight
+import video_jobs
+import frame_cache
+import frame_budget
+import chunked_upload
+from chunked_upload import UploadError
+from phash_index import INDEX as PHASH_INDEX, find_similar
+import startup
+import profiling
+import traffic_capture
+from resilience import CircuitOpen, resilience_metrics
+from admission import (
+    ADMISSION,
+    Overloaded,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_VIDEO,
 )
 
+
+class ObjectJSONProvider(DefaultJSONProvider):
+    "Serialize DetectedObject / TemporalObject in jsonify responses"
+
+    @staticmethod
+    def default(o):
+        try:
+            return to_jsonable(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
+app.json = ObjectJSONProvider(app)
 CORS(app)
 
+# Cached video frames live exactly as long as their session
+on_session_evicted(frame_cache.evict)
+
 BASE_DIR = os.path.dirname(__file__)
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".mp4", ".mov"}
+VIDEO_EXT = {".mp4", ".mov"}
+
+# Frames decoded from chunked video uploads before finalize
+# upload_id -> {tier, size, plan, frames {timestamp: frame}, offset, thread}
+FRAME_PREFETCH = {}
+FRAME_PREFETCH_LOCK = threading.Lock()
+UPLOAD_PREFETCH_STEP_BYTES = int(os.getenv("UPLOAD_PREFETCH_STEP_BYTES", str(16 * 1024 ** 2)))
+
+# Last object list per image signature (LRU), served while the vision breaker is open
+INVENTORY_CACHE = OrderedDict()
+INVENTORY_CACHE_SIZE = int(os.getenv("INVENTORY_CACHE_SIZE", "256"))
+INVENTORY_LOCK = threading.Lock()
 EXT_TO_MIME = {
     ".jpg": "image/jpeg",
     ".jpeg": "image/jpeg",
@@ -39,49 +106,421 @@ EXT_TO_MIME = {
 }
 
 
+def video_processor():
+    "OpenCV is only imported by the first video request (or warm_up)."
+    return startup.import_timed("video_processor")
+
+
+def current_load() -> float:
+    "Backend utilization in [0, 1] from admission control (active + queued)."
+    snap = ADMISSION.snapshot()
+    busy = snap["total_active"] + snap["queued"]
+    return min(1.0, busy / max(1, snap["total_limit"]))
+
+
+def plan_video_frames(video_path, tier=None):
+    """
+    Decide how many frames to sample from a saved video:
+    - frames: up-front count from clip length, a quick motion estimate,
+      the requested tier and current load
+    - refine: extra frames allowed where neighbouring frames differ
+    Returns {tier, duration, motion, load, frames, refine} or None if unreadable
+    """
+    vp = video_processor()
+    info = vp.probe_video(video_path)
+    if not info:
+        return None
+    tier = frame_budget.resolve_tier(tier)
+    load = current_load()
+    # The fast tier only needs a rough count; skip the motion decode
+    motion = vp.estimate_motion(video_path) if tier != "fast" else 0.0
+    frames = frame_budget.choose_frame_count(info["duration"], motion, tier, load)
+    return {
+        "tier": tier,
+        "duration": round(info["duration"], 2),
+        "motion": round(motion, 3),
+        "load": round(load, 3),
+        "frames": frames,
+        "refine": frame_budget.refine_budget(tier, load, frames),
+    }
+
+
 def compute_image_signature(image_bytes: bytes) -> str:
     "Make SHA1 has for the image"
     return hashlib.sha1(image_bytes).hexdigest()
 
 
-def analyze_video(video_path, question, mode):
+def admitted(classify):
     """
-    Handle video input:
-    - Extract frames
-    - Analyze each frame with vision model
-    - Aggregate temporal objects
-    - Support onepass and clarify modes
+    Run a view under admission control.
+    `classify()` returns (route_class, priority) for the current request,
+    or None to skip admission (e.g. quick async job submission).
+    Streaming responses keep their slot until the stream closes.
     """
-    # Load video bytes
-    with open(video_path, "rb") as f:
-        video_bytes = f.read()
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            ticket = classify()
+            if ticket is None:
+                return view(*args, **kwargs)
+            route, priority = ticket
+            ADMISSION.acquire(route, priority)
+            started = time.perf_counter()
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                ADMISSION.release(route, time.perf_counter() - started)
+                raise
+            if response.is_streamed:
+                response.call_on_close(
+                    lambda: ADMISSION.release(route, time.perf_counter() - started)
+                )
+            else:
+                ADMISSION.release(route, time.perf_counter() - started)
+            return response
+        return wrapper
+    return decorator
 
-    # Extract frames for convertion to image identification
-    frames = extract_frames(video_bytes)
-    if not frames:
-        return jsonify({
-            "error": "Could not extract frames from video."
-        }), 400
 
-    # Analyze each frame
+def captured(describe):
+    """
+    Append the request to the traffic trace (TRAFFIC_CAPTURE_PATH).
+    `describe()` returns the request fields (media hash/size, question, ...);
+    model calls made while the view runs are attached with their outputs.
+    Streaming responses are recorded when the stream closes.
+    With capture off this is a single check per request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not traffic_capture.enabled():
+                return view(*args, **kwargs)
+            try:
+                record = traffic_capture.start_record(request.url_rule.rule, describe())
+            except Exception as e:
+                # Capturing must never fail the request it records
+                app.logger.warning("Traffic capture skipped for %s: %s", request.path, e)
+                return view(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception as e:
+                status = 503 if isinstance(e, (Overloaded, CircuitOpen)) else getattr(e, "status", 500)
+                traffic_capture.finish_record(
+                    record, status, time.perf_counter() - started, {"error": type(e).__name__}
+                )
+                raise
+            if response.is_streamed:
+                response.call_on_close(lambda: traffic_capture.finish_record(
+                    record, response.status_code, time.perf_counter() - started, {"streamed": True}
+                ))
+            else:
+                traffic_capture.finish_record(
+                    record, response.status_code, time.perf_counter() - started,
+                    traffic_capture.result_summary(response.get_json(silent=True)),
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+def profiled(view):
+    """
+    Profile a request when asked (X-Profile: 1) or sampled.
+    Writes pstats + collapsed stacks to PROFILE_DIR; with PROFILE_DIR
+    unset this is a single check per request.
+    For streaming responses only the setup before the first event is covered.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiling.should_profile(request.headers.get(profiling.PROFILE_HEADER)):
+            return view(*args, **kwargs)
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        with profiling.profile_request(request_id):
+            response = app.make_response(view(*args, **kwargs))
+        response.headers["X-Profile-Id"] = profiling.safe_request_id(request_id)
+        return response
+    return wrapper
+
+
+def classify_analyze():
+    "Image uploads are interactive; synchronous video uploads are low priority."
+    image = request.files.get("image")
+    ext = os.path.splitext(secure_filename(image.filename or ""))[1].lower() if image else ""
+    if ext in VIDEO_EXT:
+        if form_flag("async"):
+            return None
+        return "video", PRIORITY_VIDEO
+    return "image", PRIORITY_INTERACTIVE
+
+
+def classify_chat():
+    return "chat", PRIORITY_INTERACTIVE
+
+
+def describe_analyze():
+    "Trace fields of an /analyze request (the upload itself only as hash and size)."
+    image = request.files.get("image")
+    media = {}
+    if image:
+        media = {
+            **traffic_capture.file_digest(image.stream),
+            "ext": os.path.splitext(secure_filename(image.filename or ""))[1].lower(),
+        }
+    return {
+        "media": media,
+        "question": request.form.get("question", "").strip(),
+        "mode": request.form.get("mode", "onepass").strip(),
+        "tier": request.form.get("tier", "").strip().lower() or None,
+        "async": form_flag("async"),
+        "stream": form_flag("stream"),
+    }
+
+
+def describe_clarify():
+    data = request.get_json(silent=True) or {}
+    return {"session_id": data.get("session_id"), "selection": data.get("selection")}
+
+
+def describe_chat():
+    data = request.get_json(silent=True) or {}
+    return {"session_id": data.get("session_id"), "text": data.get("text")}
+
+
+def classify_finalize():
+    "Finalizing a chunked upload runs the same analysis as /analyze."
+    status = chunked_upload.get_upload(request.view_args.get("upload_id", ""))
+    if not status:
+        return None
+    data = request.get_json(silent=True) or {}
+    if status["ext"] in VIDEO_EXT:
+        if json_flag(data, "async"):
+            return None
+        return "video", PRIORITY_VIDEO
+    return "image", PRIORITY_INTERACTIVE
+
+
+@app.errorhandler(CircuitOpen)
+def upstream_unavailable(e):
+    response = jsonify({
+        "error": "Vision service temporarily unavailable, please retry shortly.",
+        "retry_after": e.retry_after,
+    })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@app.errorhandler(UploadError)
+def upload_rejected(e):
+    response = jsonify({"error": str(e), "offset": e.offset})
+    response.status_code = e.status
+    return response
+
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({"error": f"Server busy: {str(e)}", "retry_after": e.retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def form_flag(name: str) -> bool:
+    "Read a boolean form field such as async=1 or stream=true"
+    return request.form.get(name, "").strip().lower() in ("1", "true", "yes")
+
+
+def json_flag(data: dict, name: str) -> bool:
+    "Boolean field in a JSON body (true, 1 or \"yes\")"
+    value = data.get(name)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def public_ambiguity(ambiguity):
+    "Ambiguity payload for clients, without the resolver's option_indices."
+    return {k: v for k, v in ambiguity.items() if k != "option_indices"}
+
+
+def remember_inventory(image_sig, objects):
+    "Keep the latest object list per image for degraded (breaker open) mode."
+    with INVENTORY_LOCK:
+        INVENTORY_CACHE[image_sig] = objects
+        INVENTORY_CACHE.move_to_end(image_sig)
+        while len(INVENTORY_CACHE) > INVENTORY_CACHE_SIZE:
+            INVENTORY_CACHE.popitem(last=False)
+
+
+def analyze_objects_coalesced(image_bytes, mime_type, question, image_sig=None, video_frame=False):
+    """
+    Run the vision model once for concurrent identical requests.
+    Duplicates (same image signature, question and model) arriving while
+    a call is in flight wait for it and share its result.
+    Uses the fast/strong model cascade when VISION_CASCADE enables it.
+    With PHASH_INDEX on, a near-duplicate of an earlier image upload
+    (re-shot, re-encoded, screenshot) asked the same question with the
+    same model reuses that result instead of a new vision call.
+    """
+    if image_sig is None:
+        image_sig = compute_image_signature(image_bytes)
+    if cascade_applies(video_frame):
+        vision_fn, model_key = analyze_with_cascade, "cascade"
+    else:
+        vision_fn, model_key = analyze_image_to_objects, DEFAULT_MODEL
+    key = ("vision", image_sig, question, model_key)
+
+    def run_vision():
+        if video_frame:
+            return vision_fn(image_bytes=image_bytes, mime_type=mime_type, question=question)
+        scope = (" ".join((question or "").lower().split()), model_key)
+        phash, similar = find_similar(image_bytes, scope)
+        if similar is not None:
+            return copy.deepcopy(similar)
+        parsed = vision_fn(image_bytes=image_bytes, mime_type=mime_type, question=question)
+        if phash is not None and not parsed.get("degraded") and not parsed.get("truncated"):
+            PHASH_INDEX.add(phash, scope, copy.deepcopy(parsed))
+        return parsed
+
+    try:
+        parsed = single_flight.do(key, run_vision)
+    except CircuitOpen:
+        # Degraded mode: reuse the last inventory seen for this exact image
+        cached = INVENTORY_CACHE.get(image_sig)
+        if cached is None:
+            raise
+        return {"objects": copy.deepcopy(cached), "degraded": True}
+    remember_inventory(image_sig, parsed.get("objects", []))
+    return parsed
+
+
+def iter_video_frames(frames, question, done=None, start=0):
+    """
+    Analyze extracted frames one by one with the vision model.
+    - `done` maps frame index -> (timestamp, objects) already analyzed
+      (e.g. restored from a job checkpoint); those frames are not re-sent
+    - `start`: index of the first frame (refined frames follow the base ones)
+    Yields (index, timestamp, objects) as each frame finishes
+    """
+    done = done or {}
+    for index, (frame_bytes, timestamp) in enumerate(frames, start):
+        if index in done:
+            timestamp, objects = done[index]
+        else:
+            parsed = analyze_objects_coalesced(
+                image_bytes=frame_bytes,
+                mime_type="image/jpeg",
+                question=question,
+                video_frame=True,
+            )
+            objects = parsed.get("objects", [])
+        yield index, timestamp, objects
+
+
+def analyze_video_frames(frames, question, done=None, on_frame=None, start=0):
+    """
+    Analyze every frame and collect the results.
+    `on_frame(index, timestamp, objects)` is called as each frame finishes.
+    Returns list of (timestamp, objects)
+    """
     frame_results = []
-    for frame_bytes, timestamp in frames:
-        parsed = analyze_image_to_objects(
-            image_bytes=frame_bytes,
-            mime_type="image/jpeg",
-            question=question,
-        )
-        objects = parsed.get("objects", [])
+    for index, timestamp, objects in iter_video_frames(frames, question, done, start):
+        if on_frame:
+            on_frame(index, timestamp, objects)
         frame_results.append((timestamp, objects))
+    return frame_results
 
-    # Temporal aggregation
-    temporal_objects = aggregate_temporal_objects(frame_results)
+
+def refinement_frames(video_path, frames, frame_results, budget):
+    """
+    Extra frames midway between analyzed frames whose objects differ
+    (at most `budget`), skipping times that were already sampled.
+    Returns list of (frame_bytes, timestamp_str)
+    """
+    targets = frame_budget.refine_targets(frame_results, budget)
+    if not targets:
+        return []
+    sampled = {timestamp for _, timestamp in frames}
+    return [
+        frame for frame in video_processor().extract_frames_at(video_path, targets)
+        if frame[1] not in sampled
+    ]
+
+
+def merge_by_time(items, timestamp_of):
+    "Sort frames / frame results by their timestamp label."
+    return sorted(items, key=lambda item: timestamp_seconds(timestamp_of(item)) or 0.0)
+
+
+def extract_planned_frames(video_path, plan, prefetched=None):
+    """
+    The plan's evenly spaced frames; `prefetched` ({timestamp: frame})
+    holds frames already decoded while the upload was still arriving.
+    Only prefetched frames whose timestamp the complete file also plans
+    are reused (a partial file can report a different length).
+    Returns list of (frame_bytes, timestamp_str) in time order
+    """
+    vp = video_processor()
+    reused = {}
+    if prefetched:
+        planned = set(vp.planned_timestamps(video_path, plan["frames"]))
+        reused = {ts: frame for ts, frame in prefetched.items() if ts in planned}
+    frames = vp.extract_frames_from_path(
+        video_path, plan["frames"], skip_timestamps=set(reused)
+    )
+    return merge_by_time(frames + list(reused.values()), lambda f: f[1])
+
+
+def sample_and_analyze_video(video_path, question, plan, done=None, on_frame=None, prefetched=None):
+    """
+    Base pass over `plan["frames"]` evenly spaced frames, then up to
+    `plan["refine"]` frames where the objects changed between samples.
+    Refined frames are indexed after the base frames, so `done` / `on_frame`
+    checkpoints cover them too.
+    Returns (frames, frame_results) in time order
+    """
+    frames = extract_planned_frames(video_path, plan, prefetched)
+    if not frames:
+        return [], []
+    frame_results = analyze_video_frames(frames, question, done, on_frame)
+
+    extra = refinement_frames(video_path, frames, frame_results, plan["refine"])
+    if extra:
+        frame_results += analyze_video_frames(
+            extra, question, done, on_frame, start=len(frames)
+        )
+        frames = merge_by_time(frames + extra, lambda f: f[1])
+        frame_results = merge_by_time(frame_results, lambda r: r[0])
+    return frames, frame_results
+
+
+def sse_event(event_type, data):
+    "Format one server-sent event."
+    return f"event: {event_type}\ndata: {json.dumps(data, default=to_jsonable)}\n\n"
+
+
+def sse_response(events):
+    "Wrap a generator of formatted events in an unbuffered SSE response."
+    return Response(events, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def build_video_result(question, mode, temporal_objects, frames=None, frame_results=None):
+    """
+    Turn aggregated temporal objects into the /analyze video payload.
+    When a clarify session is created, the sampled `frames` and their
+    `frame_results` are cached with it for time-targeted follow-ups.
+    Returns (payload, status_code)
+    """
     if not temporal_objects:
-        return jsonify({
+        return {
             "ok": True,
             "mode": "video",
             "answer": "No salient objects detected in the video."
-        })
+        }, 200
 
     # Detect temporal ambiguity
     ambiguity = detect_temporal_ambiguity(question, temporal_objects)
@@ -96,10 +535,13 @@ def analyze_video(video_path, question, mode):
                 "objects": temporal_objects,
                 "question": question,
                 "type": "video",
+                "selection_index": build_resolver(ambiguity, temporal_objects),
             })
+            if frames:
+                frame_cache.store_frames(session_id, frames, frame_results or [])
             append_history(session_id, "user", question)
             append_history(session_id, "assistant", ambiguity["clarifying_question"])
-            return jsonify({
+            return {
                 "ok": True,
                 "mode": "clarify",
                 "session_id": session_id,
@@ -107,7 +549,7 @@ def analyze_video(video_path, question, mode):
                     "question": ambiguity["clarifying_question"],
                     "options": ambiguity["options"],
                 }
-            })
+            }, 200
         else:
             # Unambiguous → answer directly
             selected_object = temporal_objects[0]
@@ -117,34 +559,311 @@ def analyze_video(video_path, question, mode):
                 all_objects=temporal_objects,
                 temporal=True
             )
-            return jsonify({
+            return {
                 "ok": True,
                 "mode": "video",
                 "answer": answer
-            })
+            }, 200
 
     # ONEPASS MODE: Respond in one pass
-    answer_lines = []
-    for obj in temporal_objects:
-        first = obj["first_seen"]
-        last = obj["last_seen"]
-        name = obj["name"]
-        if first == last:
-            line = f"{name} appears at {first}."
-        else:
-            line = f"{name} appears from {first} to {last}."
-        answer_lines.append(line)
+    answer_lines = [format_temporal_line(obj) for obj in temporal_objects]
     answer_lines.append("")
     answer_lines.append(
         "Note: appearance times are based on sampled key frames."
     )
-    return jsonify({
+    return {
         "ok": True,
         "mode": "video",
         "answer": "\n".join(answer_lines),
         "temporal_objects": temporal_objects,
-        "ambiguity": ambiguity
+        "ambiguity": public_ambiguity(ambiguity)
+    }, 200
+
+
+def analyze_video(video_path, question, mode, tier=None, prefetch=None):
+    """
+    Handle video input:
+    - Extract frames (count adapted to the clip, tier and load)
+    - Analyze each frame with vision model, refining where objects change
+    - Aggregate temporal objects
+    - Support onepass and clarify modes
+    `prefetch` ({plan, frames}) comes from a chunked upload, see finalize.
+    """
+    prefetch = prefetch or {}
+    plan = prefetch.get("plan") or plan_video_frames(video_path, tier)
+    # Extract frames for convertion to image identification
+    frames, frame_results = (
+        sample_and_analyze_video(
+            video_path, question, plan, prefetched=prefetch.get("frames")
+        ) if plan else ([], [])
+    )
+    if not frames:
+        return jsonify({
+            "error": "Could not extract frames from video."
+        }), 400
+
+    # Temporal aggregation
+    temporal_objects = aggregate_temporal_objects(frame_results)
+    payload, status_code = build_video_result(
+        question, mode, temporal_objects, frames, frame_results
+    )
+    payload["frame_plan"] = plan
+    return jsonify(payload), status_code
+
+
+def stream_video_onepass(video_path, question, tier=None, prefetch=None):
+    """
+    Onepass video analysis as a server-sent events stream.
+    Each analyzed frame emits the temporal objects it created or extended
+    (with spoken lines for them), so feedback starts after the first frame.
+    Refinement frames follow the base pass (frames_total grows then).
+    The final "done" event carries the same payload as analyze_video.
+    """
+    prefetch = prefetch or {}
+    plan = prefetch.get("plan") or plan_video_frames(video_path, tier)
+    frames = extract_planned_frames(video_path, plan, prefetch.get("frames")) if plan else []
+    if not frames:
+        return jsonify({
+            "error": "Could not extract frames from video."
+        }), 400
+
+    def stream():
+        aggregator = TemporalAggregator()
+        frame_results = []
+
+        def frame_events(batch, start, frames_total):
+            for index, timestamp, objects in iter_video_frames(batch, question, start=start):
+                frame_results.append((timestamp, objects))
+                updates = aggregator.add_frame(timestamp, objects)
+                yield sse_event("frame", {
+                    "index": index,
+                    "timestamp": timestamp,
+                    "frames_total": frames_total,
+                    "updates": updates,
+                    "answer": "\n".join(
+                        format_temporal_line(u["object"]) for u in updates
+                    ),
+                })
+
+        try:
+            yield from frame_events(frames, 0, len(frames))
+            extra = refinement_frames(video_path, frames, frame_results, plan["refine"])
+            yield from frame_events(extra, len(frames), len(frames) + len(extra))
+            payload, status_code = build_video_result(
+                question, "onepass", aggregator.objects()
+            )
+            payload["frame_plan"] = plan
+            yield sse_event("done", {"status_code": status_code, "result": payload})
+        except Exception as e:
+            yield sse_event("failed", {"error": f"Video analysis failed: {str(e)}"})
+
+    return sse_response(stream())
+
+
+def stream_image_onepass(image_bytes, mime_type, question):
+    """
+    Onepass image analysis as a server-sent events stream.
+    Objects are emitted as the vision model finishes writing each one,
+    with the ambiguity check re-run on the partial list; the final
+    "done" event carries the same payload as the non-streaming route.
+    """
+    def stream():
+        objects = []
+        ambiguity = detect_ambiguity(question, objects)
+        try:
+            for obj in stream_image_objects(
+                image_bytes=image_bytes,
+                mime_type=mime_type,
+                question=question,
+            ):
+                objects.append(obj)
+                ambiguity = detect_ambiguity(question, objects)
+                yield sse_event("object", {
+                    "object": obj,
+                    "line": f"{obj.name}: {format_object_details(obj)}",
+                    "is_ambiguous": ambiguity["is_ambiguous"],
+                })
+            yield sse_event("done", {"status_code": 200, "result": {
+                "ok": True,
+                "mode": "onepass",
+                "answer": generate_onepass_response(objects, ambiguity=ambiguity),
+                "ambiguity": public_ambiguity(ambiguity),
+            }})
+        except Exception as e:
+            yield sse_event("failed", {"error": f"Image analysis failed: {str(e)}"})
+
+    return sse_response(stream())
+
+
+def run_video_job(job_id):
+    """
+    Worker-side video analysis for asynchronous /analyze requests.
+    Per-frame results are checkpointed, so a resumed job only
+    analyzes the frames it has not finished yet.
+    """
+    job = video_jobs.get_job(job_id)
+    # A resumed job keeps its original plan so checkpointed indices still match
+    plan = job.get("frame_plan") or plan_video_frames(job["video_path"], job.get("tier"))
+    if not plan:
+        video_jobs.finish_job(job_id, {
+            "error": "Could not extract frames from video."
+        }, 400)
+        return
+    video_jobs.set_frames_total(job_id, plan["frames"], frame_plan=plan)
+
+    frames, frame_results = sample_and_analyze_video(
+        job["video_path"],
+        job["question"],
+        plan,
+        done=video_jobs.completed_frames(job_id),
+        on_frame=lambda index, timestamp, objects: video_jobs.record_frame(
+            job_id, index, timestamp, objects
+        ),
+    )
+    if not frames:
+        video_jobs.finish_job(job_id, {
+            "error": "Could not extract frames from video."
+        }, 400)
+        return
+    temporal_objects = aggregate_temporal_objects(frame_results)
+    payload, status_code = build_video_result(
+        job["question"], job["mode"], temporal_objects, frames, frame_results
+    )
+    payload["frame_plan"] = plan
+    video_jobs.finish_job(job_id, payload, status_code)
+
+
+@app.before_request
+def ensure_video_workers():
+    """
+    Start the job workers, resuming jobs a previous process left unfinished,
+    in whichever process serves requests (dev server, WSGI worker).
+    No-op once they are running.
+    """
+    video_jobs.start_workers(run_video_job)
+
+
+def submit_video_job(video_path, question, mode, tier=None, frame_plan=None):
+    """
+    Queue a video for background analysis and return its job id at once.
+    A `frame_plan` made during a chunked upload is reused by the worker.
+    """
+    job_id = video_jobs.create_job({
+        "video_path": video_path,
+        "question": question,
+        "mode": mode,
+        "tier": tier,
+        "frame_plan": frame_plan,
     })
+    return jsonify({
+        "ok": True,
+        "mode": "video",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events",
+    }), 202
+
+
+def start_frame_prefetch(upload_id, offset):
+    """
+    Decode planned frames from a video upload that is still arriving.
+    Runs in the background, at most one pass per upload at a time and
+    only after UPLOAD_PREFETCH_STEP_BYTES more bytes arrived. Works when
+    the container index is at the front of the file (fast-start MP4/MOV);
+    otherwise nothing is decodable until the upload is complete.
+    """
+    with FRAME_PREFETCH_LOCK:
+        state = FRAME_PREFETCH.get(upload_id)
+        if not state or (state["thread"] and state["thread"].is_alive()):
+            return
+        if offset - state["offset"] < UPLOAD_PREFETCH_STEP_BYTES:
+            return
+        state["offset"] = offset
+        state["thread"] = threading.Thread(
+            target=prefetch_frames,
+            args=(state, chunked_upload.part_path(upload_id)),
+            name=f"prefetch-{upload_id[:8]}",
+            daemon=True,
+        )
+        state["thread"].start()
+
+
+def prefetch_frames(state, partial_path):
+    """
+    One prefetch pass: plan once, then decode the frames not decoded yet.
+    Until the whole file is there, the last frame a pass decodes may have
+    been cut off mid-sample, so it is only kept once a later frame (stored
+    further into the file) decodes as well.
+    """
+    try:
+        received = os.path.getsize(partial_path)
+        if state["plan"] is None:
+            state["plan"] = plan_video_frames(partial_path, state["tier"])
+        if not state["plan"]:
+            return
+        frames = merge_by_time(video_processor().extract_frames_from_path(
+            partial_path, state["plan"]["frames"], skip_timestamps=set(state["frames"])
+        ), lambda f: f[1])
+        complete = state["size"] is not None and received >= state["size"]
+        if frames and not complete:
+            frames.pop()
+        for frame in frames:
+            state["frames"][frame[1]] = frame
+    except Exception as e:
+        # Partial files fail now and then; finalize decodes what is missing
+        app.logger.warning("Frame prefetch from %s failed: %s", partial_path, e)
+
+
+def wait_frame_prefetch(upload_id):
+    "Let a running prefetch pass finish and return its {plan, frames}."
+    with FRAME_PREFETCH_LOCK:
+        state = FRAME_PREFETCH.get(upload_id)
+        thread = state["thread"] if state else None
+    if not state:
+        return None
+    if thread:
+        thread.join()
+    return {"plan": state["plan"], "frames": dict(state["frames"])}
+
+
+def drop_frame_prefetch(upload_id=None):
+    "Forget one upload's prefetch state, or (no id) those of vanished uploads."
+    with FRAME_PREFETCH_LOCK:
+        if upload_id is not None:
+            FRAME_PREFETCH.pop(upload_id, None)
+            return
+        for stale in [
+            uid for uid in FRAME_PREFETCH
+            if not os.path.exists(chunked_upload.part_path(uid))
+        ]:
+            FRAME_PREFETCH.pop(stale, None)
+
+
+def answer_about_frame(question, focus, frame, history=None):
+    """
+    Answer a follow-up about one cached video frame.
+    The frame is re-analyzed with the follow-up question; if that fails,
+    the objects recorded for the frame during the first pass are used.
+    """
+    try:
+        parsed = analyze_objects_coalesced(
+            image_bytes=frame["frame_bytes"],
+            mime_type="image/jpeg",
+            question=question,
+            video_frame=True,
+        )
+        frame_objects = parsed.get("objects", [])
+    except Exception:
+        frame_objects = frame["objects"]
+
+    return generate_natural_answer(
+        question=question,
+        selected_object=focus,
+        all_objects=frame_objects,
+        temporal=True,
+        history=history,
+        frame_timestamp=frame["timestamp"],
+    )
 
 
 @app.route("/")
@@ -154,6 +873,9 @@ def home():
 
 
 @app.route("/analyze", methods=["POST"])
+@captured(describe_analyze)
+@admitted(classify_analyze)
+@profiled
 def analyze():
     "Analyze the first-round image or video."
     if "image" not in request.files:
@@ -162,6 +884,8 @@ def analyze():
     image = request.files["image"]
     mode = request.form.get("mode", "onepass").strip()
     question = request.form.get("question", "").strip()
+    # Video frame budget: fast / balanced / thorough (VIDEO_FRAME_TIER by default)
+    tier = request.form.get("tier", "").strip().lower() or None
     if not question:
         return jsonify({"error": "Missing question"}), 400
 
@@ -173,19 +897,48 @@ def analyze():
     saved_name = f"{uuid.uuid4().hex}{ext}"
     saved_path = os.path.join(UPLOAD_DIR, saved_name)
     image.save(saved_path)
+    return analyze_saved_file(
+        saved_path, ext, question, mode, tier,
+        run_async=form_flag("async"),
+        stream=form_flag("stream"),
+    )
+
+
+def analyze_saved_file(saved_path, ext, question, mode, tier=None,
+                       run_async=False, stream=False, prefetch=None):
+    """
+    Analyze an uploaded file already on disk (from /analyze or a
+    finalized chunked upload).
+    - run_async: videos only, return a job id at once
+    - stream: onepass only, server-sent events
+    - prefetch: {plan, frames} decoded while a chunked video upload arrived
+    """
+    traffic_capture.keep_media(saved_path)
     # Activate video analysis function if the input is video stream
-    if ext in [".mp4", ".mov"]:
-        return analyze_video(saved_path, question, mode)
+    if ext in VIDEO_EXT:
+        # Asynchronous mode -> return a job id and analyze in the background
+        if run_async:
+            return submit_video_job(
+                saved_path, question, mode, tier, (prefetch or {}).get("plan")
+            )
+        # Streaming onepass -> incremental results as frames are analyzed
+        if mode == "onepass" and stream:
+            return stream_video_onepass(saved_path, question, tier, prefetch)
+        return analyze_video(saved_path, question, mode, tier, prefetch)
     # Or otherwise analyze image and feed the image to vision model
     with open(saved_path, "rb") as f:
         image_bytes = f.read()
 
     image_sig = compute_image_signature(image_bytes)
     mime_type = EXT_TO_MIME.get(ext, "image/jpeg")
-    parsed = analyze_image_to_objects(
+    # Streaming onepass -> objects as soon as the model writes them
+    if mode == "onepass" and stream:
+        return stream_image_onepass(image_bytes, mime_type, question)
+    parsed = analyze_objects_coalesced(
         image_bytes=image_bytes,
         mime_type=mime_type,
         question=question,
+        image_sig=image_sig,
     )
     objects = parsed.get("objects", [])
     ambiguity = detect_ambiguity(question, objects)
@@ -198,7 +951,7 @@ def analyze():
             "ok": True,
             "mode": mode,
             "answer": answer,
-            "ambiguity": ambiguity
+            "ambiguity": public_ambiguity(ambiguity)
         })
     # CLARIFY MODE: Clarify Iteratively
     elif mode == "clarify":
@@ -209,7 +962,8 @@ def analyze():
                 "objects": objects,
                 "question": question,
                 "image_signature": image_sig,
-                "type": "image"
+                "type": "image",
+                "selection_index": build_resolver(ambiguity, objects),
             })
             append_history(session_id, "user", question)
             append_history(session_id, "assistant", ambiguity["clarifying_question"])
@@ -237,7 +991,91 @@ def analyze():
     return jsonify({"error": "Invalid mode"}), 400
 
 
+@app.route("/uploads", methods=["POST"])
+def upload_init():
+    """
+    Start a chunked, resumable upload (large videos from slow connections).
+    JSON: filename, size (optional), sha256 (optional),
+    prefetch (videos: decode frames while chunks arrive), tier
+    Then: PUT /uploads/<id>?offset=N with raw chunk bytes,
+    GET /uploads/<id> to find the offset after a dropped connection,
+    POST /uploads/<id>/finalize with the /analyze fields.
+    """
+    data = request.get_json(silent=True) or {}
+    ext = os.path.splitext(secure_filename(data.get("filename") or ""))[1].lower()
+    if ext not in ALLOWED_EXT:
+        return jsonify({"error": "Unsupported file type"}), 400
+    size = data.get("size")
+    if size is not None and not isinstance(size, int):
+        return jsonify({"error": "size must be an integer"}), 400
+
+    status = chunked_upload.init_upload(ext, size, data.get("sha256"))
+    drop_frame_prefetch()
+    if ext in VIDEO_EXT and json_flag(data, "prefetch"):
+        with FRAME_PREFETCH_LOCK:
+            FRAME_PREFETCH[status["upload_id"]] = {
+                "tier": (data.get("tier") or "").strip().lower() or None,
+                "size": size,
+                "plan": None,
+                "frames": {},
+                "offset": 0,
+                "thread": None,
+            }
+    return jsonify({"ok": True, **status}), 201
+
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    "Upload progress; `offset` is where the next chunk starts."
+    status = chunked_upload.get_upload(upload_id)
+    if not status:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify({"ok": True, **status})
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    "Append one chunk (raw body) at ?offset=N; streamed to disk as it arrives."
+    try:
+        offset = int(request.args.get("offset", ""))
+    except ValueError:
+        return jsonify({"error": "Missing or invalid offset"}), 400
+    status = chunked_upload.append_chunk(upload_id, offset, request.stream)
+    start_frame_prefetch(upload_id, status["offset"])
+    return jsonify({"ok": True, **status})
+
+
+@app.route("/uploads/<upload_id>/finalize", methods=["POST"])
+@admitted(classify_finalize)
+@profiled
+def upload_finalize(upload_id):
+    """
+    Verify the upload and analyze it like /analyze.
+    JSON: question, mode, tier, async, stream
+    """
+    data = request.get_json(silent=True) or {}
+    mode = (data.get("mode") or "onepass").strip()
+    question = (data.get("question") or "").strip()
+    tier = (data.get("tier") or "").strip().lower() or None
+    if not question:
+        return jsonify({"error": "Missing question"}), 400
+
+    # Let a running prefetch pass finish before the partial file moves
+    prefetch = wait_frame_prefetch(upload_id)
+    upload = chunked_upload.finalize_upload(upload_id, UPLOAD_DIR)
+    drop_frame_prefetch(upload_id)
+    return analyze_saved_file(
+        upload["path"], upload["ext"], question, mode, tier,
+        run_async=json_flag(data, "async"),
+        stream=json_flag(data, "stream"),
+        prefetch=prefetch,
+    )
+
+
 @app.route("/clarify", methods=["POST"])
+@captured(describe_clarify)
+@admitted(classify_chat)
+@profiled
 def clarify():
     """
     Second-round interaction for clarification options
@@ -258,65 +1096,21 @@ def clarify():
     objects = session.get("objects", [])
     if not objects:
         return jsonify({"error": "Session has no objects"}), 400
-    selected_object = None
-
-    # Image session matching -> name #id + fallback by name
-    if session_type == "image":
-        # Try match by "name #id"
-        for obj in objects:
-            obj_name = str(obj.get("name", "")).strip()
-            obj_id = obj.get("id", None)
-            label = f"{obj_name} #{obj_id}"
-            if obj_name and obj_id is not None and label in selection:
-                selected_object = obj
-                break
-        # Fallback by name
-        if not selected_object:
-            sel_lower = selection.lower()
-            for obj in objects:
-                obj_name = str(obj.get("name", "")).lower()
-                if obj_name and obj_name in sel_lower:
-                    selected_object = obj
-                    break
-        # Final fallback: if only one object, pick it
-        if not selected_object and len(objects) == 1:
-            selected_object = objects[0]
-
-    # Video session matching -> temporal option strings + fallback by name
-    # Objects are temporal_objects: 
-    # {name, first_seen, last_seen, ...}
-    else:
-        sel_lower = selection.lower()
-        # Prefer exact match with the option format
-        # Options like: "vase (0.0s–4.77s)" or "vase at 1.17s"
-        for obj in objects:
-            name = str(obj.get("name", "")).strip()
-            first = str(obj.get("first_seen", "")).strip()
-            last = str(obj.get("last_seen", "")).strip()
-            if not name:
-                continue
-            if first and last and first != last:
-                option_label = f"{name} ({first}–{last})".lower()
-            elif first:
-                option_label = f"{name} at {first}".lower()
-            else:
-                option_label = name.lower()
-            if option_label == sel_lower:
-                selected_object = obj
-                break
-        # Fallback: match by name substring
-        if not selected_object:
-            for obj in objects:
-                name = str(obj.get("name", "")).lower()
-                if name and name in sel_lower:
-                    selected_object = obj
-                    break
-        # Final fallback: if only one object, pick it
-        if not selected_object and len(objects) == 1:
-            selected_object = objects[0]
+    # Resolve against the options offered when the session was created
+    # (exact label, "#id", or spoken variants like "the left one")
+    resolver = session.get("selection_index")
+    index = resolver.resolve(selection) if resolver else None
+    # Final fallback: if only one object, pick it
+    if index is None and len(objects) == 1:
+        index = 0
+    selected_object = objects[index] if index is not None else None
 
     if not selected_object:
-        return jsonify({"error": "Could not match selection"}), 400
+        # Several options still fit -> ask again among just those
+        return jsonify({
+            "error": "Could not match selection",
+            "options": resolver.remaining_options(selection) if resolver else [],
+        }), 400
     
     # Set focus + record history
     set_focus_object(session_id, selected_object)
@@ -326,9 +1120,9 @@ def clarify():
     try:
         if session_type == "video":
             # Make time context explicit so LLM uses it
-            first = selected_object.get("first_seen", "")
-            last = selected_object.get("last_seen", "")
-            name = selected_object.get("name", "object")
+            first = selected_object.first_seen
+            last = selected_object.last_seen
+            name = selected_object.name
 
             temporal_context = f"The selected object is '{name}'. "
             if first and last and first != last:
@@ -366,6 +1160,9 @@ def clarify():
 
 
 @app.route("/chat", methods=["POST"])
+@captured(describe_chat)
+@admitted(classify_chat)
+@profiled
 def chat():
     "Follow-up chat for third+ rounds"
     data = request.json
@@ -383,15 +1180,25 @@ def chat():
     objects = session.get("objects", [])
 
     session_type = session.get("type", "image")
+    # Earlier turns (clarification, selection, follow-ups) for context
+    history = list(session.get("history", []))
 
     append_history(session_id, "user", user_text)
 
-    answer = generate_natural_answer(
-        question=user_text,
-        selected_object=focus,
-        all_objects=objects,
-        temporal=(session_type == "video")
-    )
+    # Time-targeted video follow-up ("what is on the table at 3 seconds?")
+    # -> look at the cached frame closest to that time
+    seconds = frame_cache.parse_time_reference(user_text) if session_type == "video" else None
+    frame = frame_cache.lookup(session_id, seconds) if seconds is not None else None
+    if frame:
+        answer = answer_about_frame(user_text, focus, frame, history)
+    else:
+        answer = generate_natural_answer(
+            question=user_text,
+            selected_object=focus,
+            all_objects=objects,
+            temporal=(session_type == "video"),
+            history=history,
+        )
 
     append_history(session_id, "assistant", answer)
 
@@ -401,6 +1208,68 @@ def chat():
     })
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    "Progress and (when finished) the result of an asynchronous video job"
+    job = video_jobs.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    frames = [
+        {"index": int(i), **f}
+        for i, f in sorted(job["frames"].items(), key=lambda x: int(x[0]))
+    ]
+    return jsonify({
+        "ok": True,
+        "job_id": job_id,
+        "status": job["status"],
+        "frames_total": job["frames_total"],
+        "frames_done": len(frames),
+        "frames": frames,
+        "result": job["result"],
+        "error": job["error"],
+    })
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    "Server-sent events stream of per-frame progress and the final result"
+    if not video_jobs.get_job(job_id):
+        return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        for event in video_jobs.iter_events(job_id):
+            if event is None:
+                # Keep-alive comment so proxies do not close the stream
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event["type"], event)
+
+    return sse_response(stream())
+
+
+@app.route("/warmup", methods=["POST"])
+def warmup():
+    "Build clients and import OpenCV now instead of on the first request"
+    data = request.get_json(silent=True) or {}
+    # Video warm-up (OpenCV import) unless "video" is explicitly false
+    video = json_flag(data, "video") if "video" in data else True
+    return jsonify({"ok": True, "startup": startup.warm_up(video=video)})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    "Runtime metrics for the backend"
+    return jsonify({
+        "startup": startup.startup_report(),
+        "admission": ADMISSION.snapshot(),
+        "vision_cascade": cascade_metrics(),
+        "upstream": resilience_metrics(),
+        "single_flight": {"in_flight": single_flight.in_flight_count()},
+        "phash_index": PHASH_INDEX.snapshot(),
+        "answer_prompt": prompt_cache_metrics(),
+    })
+
+
 @app.route("/end_session", methods=["POST"])
 def end_session_route():
     "End session"
@@ -410,5 +1279,10 @@ def end_session_route():
     return jsonify({"ok": True})
 
 
+startup.STARTUP_TIMINGS["import app"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+if os.getenv("WARM_UP_ON_START", "").strip().lower() in ("1", "true", "yes"):
+    startup.warm_up()
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Resumable uploads: init -> append chunks at an offset -> finalize.
+# Chunks go straight to <id>.part on disk; <id>.json holds the metadata,
+# so an upload survives both a dropped connection and a backend restart.
+BASE_DIR = os.path.dirname(__file__)
+CHUNKED_DIR = os.path.join(BASE_DIR, "uploads", "chunked")
+os.makedirs(CHUNKED_DIR, exist_ok=True)
+
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+# Suggested chunk size for clients; any size is accepted
+CHUNK_SIZE_HINT = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 ** 2)))
+UPLOAD_TTL_SECONDS = int(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+# Bytes read from the request stream per write
+_BLOCK_SIZE = 1024 * 1024
+
+# upload_id -> {"meta": {...}, "hash": hashlib object, "lock": Lock}
+UPLOADS = {}
+_LOCK = threading.Lock()
+
+
+class UploadError(Exception):
+    "Rejected upload operation; `offset` tells the client where to resume."
+
+    def __init__(self, message: str, status: int = 400, offset: int | None = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _part_path(upload_id: str) -> str:
+    return os.path.join(CHUNKED_DIR, f"{upload_id}.part")
+
+
+def _meta_path(upload_id: str) -> str:
+    return os.path.join(CHUNKED_DIR, f"{upload_id}.json")
+
+
+def _write_meta(meta: dict) -> None:
+    # Write-then-rename so a crash never leaves half-written metadata
+    path = _meta_path(meta["upload_id"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def _status(meta: dict) -> dict:
+    return {k: meta[k] for k in ("upload_id", "ext", "size", "offset", "complete")}
+
+
+def _remove(upload_id: str) -> None:
+    for path in (_part_path(upload_id), _meta_path(upload_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load(upload_id: str) -> dict | None:
+    """
+    In-memory entry for an upload, restoring it from disk after a restart.
+    The running hash is rebuilt from the bytes already on disk, and the
+    offset is trimmed to what actually reached the file.
+    """
+    with _LOCK:
+        entry = UPLOADS.get(upload_id)
+        if entry:
+            return entry
+        try:
+            with open(_meta_path(upload_id)) as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        digest = hashlib.sha256()
+        offset = 0
+        try:
+            with open(_part_path(upload_id), "rb") as f:
+                for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+                    digest.update(block)
+                    offset += len(block)
+        except OSError:
+            pass
+        meta["offset"] = offset
+        entry = {"meta": meta, "hash": digest, "lock": threading.Lock()}
+        UPLOADS[upload_id] = entry
+        return entry
+
+
+def purge_expired() -> int:
+    "Drop uploads that were not touched for UPLOAD_TTL_SECONDS."
+    cutoff = _now() - UPLOAD_TTL_SECONDS
+    stale = []
+    for fname in os.listdir(CHUNKED_DIR):
+        if not fname.endswith(".json"):
+            continue
+        path = os.path.join(CHUNKED_DIR, fname)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                stale.append(fname[:-len(".json")])
+        except OSError:
+            continue
+    for upload_id in stale:
+        with _LOCK:
+            UPLOADS.pop(upload_id, None)
+        _remove(upload_id)
+    return len(stale)
+
+
+def init_upload(ext: str, size: int | None = None, sha256: str | None = None) -> dict:
+    """
+    Start an upload.
+    - ext: file extension (already validated by the caller)
+    - size: total bytes, if known; enables the completeness check
+    - sha256: expected hex digest, checked at finalize
+    """
+    if size is not None and (size < 0 or size > MAX_UPLOAD_BYTES):
+        raise UploadError(f"Upload size must be between 0 and {MAX_UPLOAD_BYTES} bytes", 413)
+    # Opportunistic cleanup so abandoned uploads do not pile up
+    purge_expired()
+    upload_id = uuid.uuid4().hex
+    meta = {
+        "upload_id": upload_id,
+        "ext": ext,
+        "size": size,
+        "sha256": (sha256 or "").lower() or None,
+        "offset": 0,
+        "complete": False,
+        "created_at": _now(),
+    }
+    open(_part_path(upload_id), "wb").close()
+    _write_meta(meta)
+    with _LOCK:
+        UPLOADS[upload_id] = {"meta": meta, "hash": hashlib.sha256(), "lock": threading.Lock()}
+    return {**_status(meta), "chunk_size": CHUNK_SIZE_HINT}
+
+
+def get_upload(upload_id: str) -> dict | None:
+    "Current status, e.g. the offset to resume from after a dropped connection."
+    entry = _load(upload_id)
+    if not entry:
+        return None
+    with entry["lock"]:
+        return _status(entry["meta"])
+
+
+def part_path(upload_id: str) -> str:
+    "File holding the bytes received so far (readable while the upload runs)."
+    return _part_path(upload_id)
+
+
+def append_chunk(upload_id: str, offset: int, stream) -> dict:
+    """
+    Append the bytes of `stream` (e.g. request.stream) at `offset`.
+    The offset must equal the bytes already received; a mismatch raises
+    UploadError(409) carrying the offset to resume from. Bytes are written
+    and hashed block by block, so a connection dropped mid-chunk still
+    keeps everything that arrived.
+    """
+    entry = _load(upload_id)
+    if not entry:
+        raise UploadError("Unknown upload", 404)
+    with entry["lock"]:
+        meta = entry["meta"]
+        if meta["complete"]:
+            raise UploadError("Upload already finalized", 409, meta["offset"])
+        if offset != meta["offset"]:
+            raise UploadError("Offset mismatch", 409, meta["offset"])
+        limit = meta["size"] if meta["size"] is not None else MAX_UPLOAD_BYTES
+        try:
+            with open(_part_path(upload_id), "ab") as f:
+                for block in iter(lambda: stream.read(_BLOCK_SIZE), b""):
+                    if meta["offset"] + len(block) > limit:
+                        raise UploadError("Chunk exceeds the upload size", 413, meta["offset"])
+                    f.write(block)
+                    f.flush()
+                    entry["hash"].update(block)
+                    meta["offset"] += len(block)
+        finally:
+            _write_meta(meta)
+        return _status(meta)
+
+
+def finalize_upload(upload_id: str, dest_dir: str) -> dict:
+    """
+    Check size and hash, then move the file to `dest_dir/<upload_id><ext>`.
+    Returns {path, ext, size, sha256}
+    """
+    entry = _load(upload_id)
+    if not entry:
+        raise UploadError("Unknown upload", 404)
+    with entry["lock"]:
+        meta = entry["meta"]
+        if meta["complete"]:
+            raise UploadError("Upload already finalized", 409, meta["offset"])
+        if meta["size"] is not None and meta["offset"] != meta["size"]:
+            raise UploadError("Upload incomplete", 409, meta["offset"])
+        if meta["offset"] == 0:
+            raise UploadError("Upload is empty", 400, 0)
+        digest = entry["hash"].hexdigest()
+        if meta["sha256"] and meta["sha256"] != digest:
+            raise UploadError("Checksum mismatch", 422, meta["offset"])
+        path = os.path.join(dest_dir, f"{upload_id}{meta['ext']}")
+        shutil.move(_part_path(upload_id), path)
+        meta["complete"] = True
+    with _LOCK:
+        UPLOADS.pop(upload_id, None)
+    _remove(upload_id)
+    return {"path": path, "ext": meta["ext"], "size": meta["offset"], "sha256": digest}
@@ -0,0 +1,143 @@
+import sys
+from typing import Any, Dict, List, Optional
+
+# Values the vision model uses for "not known"; stored as None instead
+_MISSING = {"", "none", "null", "unknown", "n/a"}
+
+
+def _intern(value: Any) -> Optional[str]:
+    """
+    Normalize an optional short string field and intern it.
+    Names, colors and positions repeat across objects, frames and
+    sessions, so every instance shares one string.
+    """
+    if value is None:
+        return None
+    s = str(value).strip()
+    if s.lower() in _MISSING:
+        return None
+    return sys.intern(s)
+
+
+def _to_int(value: Any, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class DetectedObject:
+    """
+    One object detected in an image (or a single video frame).
+    Built once by from_raw() at the vision boundary; consumers can rely
+    on the field types without re-validating.
+    """
+
+    __slots__ = ("id", "name", "key", "count", "color", "position", "attributes")
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        count: int = 1,
+        color: Optional[str] = None,
+        position: Optional[str] = None,
+        attributes: tuple = (),
+    ):
+        self.id = id
+        self.name = name
+        # Lowercased name used for grouping and matching
+        self.key = sys.intern(name.lower())
+        self.count = count
+        self.color = color
+        self.position = position
+        self.attributes = attributes
+
+    @classmethod
+    def from_raw(cls, raw: Any, idx: int) -> Optional["DetectedObject"]:
+        """
+        Validate one object dict from the model (or a serialized copy).
+        Returns None for entries that are not objects at all.
+        """
+        if not isinstance(raw, dict):
+            return None
+        raw_id = raw.get("id", idx)
+        obj_id = int(raw_id) if str(raw_id).isdigit() else idx
+        attrs = raw.get("attributes")
+        if not isinstance(attrs, list):
+            attrs = []
+        return cls(
+            id=obj_id,
+            name=_intern(raw.get("name")) or "object",
+            count=_to_int(raw.get("count", 1), 1),
+            color=_intern(raw.get("color")),
+            position=_intern(raw.get("position")),
+            attributes=tuple(a for a in (_intern(a) for a in attrs) if a),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "count": self.count,
+            "color": self.color,
+            "position": self.position,
+            "attributes": list(self.attributes),
+        }
+
+    def __repr__(self) -> str:
+        return f"DetectedObject({self.to_dict()!r})"
+
+
+class TemporalObject:
+    """
+    An object aggregated across sampled video frames.
+    """
+
+    __slots__ = ("name", "first_seen", "last_seen")
+
+    def __init__(self, name: str, first_seen: str, last_seen: str):
+        self.name = sys.intern(name)
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TemporalObject":
+        return cls(
+            name=str(data.get("name") or "object"),
+            first_seen=str(data.get("first_seen", "")),
+            last_seen=str(data.get("last_seen", "")),
+        )
+
+    def copy(self) -> "TemporalObject":
+        return TemporalObject(self.name, self.first_seen, self.last_seen)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+    def __repr__(self) -> str:
+        return f"TemporalObject({self.to_dict()!r})"
+
+
+def parse_objects(raw_objects: List[Any]) -> List[DetectedObject]:
+    "Single validation pass over the model's object list."
+    objects = []
+    for i, raw in enumerate(raw_objects, start=1):
+        obj = DetectedObject.from_raw(raw, i)
+        if obj is not None:
+            objects.append(obj)
+    return objects
+
+
+def to_jsonable(o: Any) -> Any:
+    """
+    json `default=` hook for DetectedObject / TemporalObject.
+    Raises TypeError for anything else, like json itself.
+    """
+    if isinstance(o, (DetectedObject, TemporalObject)):
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
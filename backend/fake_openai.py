@@ -0,0 +1,139 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Used to exercise hedging, the circuit breaker and degraded fallbacks
+without real upstream calls. Point the backend at it with:
+
+    python fake_openai.py --port 8001 --delay 0.5 --slow-rate 0.1 --error-rate 0.05
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake python app.py
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_OBJECTS = {
+    "objects": [
+        {"id": 1, "name": "cup", "count": 1, "color": "red", "position": "left", "attributes": ["ceramic"]},
+        {"id": 2, "name": "cup", "count": 1, "color": "blue", "position": "right", "attributes": []},
+        {"id": 3, "name": "table", "count": 1, "color": "brown", "position": "bottom", "attributes": ["wooden"]},
+    ]
+}
+FAKE_COMPACT = {"o": [["cup", 1, "red", "l", ["ceramic"]], ["cup", 1, "blue", "r", []], ["table", 1, "brown", "b", ["wooden"]]]}
+FAKE_ANSWER = "This is a fake answer from the local test server."
+
+
+class FakeBehavior:
+    def __init__(self, delay=0.2, jitter=0.1, error_rate=0.0, slow_rate=0.0, slow_delay=5.0):
+        self.delay = delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+
+    def latency(self) -> float:
+        if random.random() < self.slow_rate:
+            return self.slow_delay
+        return max(0.0, self.delay + random.uniform(-self.jitter, self.jitter))
+
+
+def completion_content(body: dict) -> str:
+    "Pick a canned reply: object JSON for vision prompts, text otherwise."
+    messages = body.get("messages", [])
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    if body.get("response_format", {}).get("type") == "json_object":
+        if "compact object list" in str(system):
+            return json.dumps(FAKE_COMPACT)
+        return json.dumps(FAKE_OBJECTS)
+    return FAKE_ANSWER
+
+
+def make_handler(behavior: FakeBehavior, content_fn=completion_content):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, status: int, payload: dict) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+
+            time.sleep(behavior.latency())
+            if random.random() < behavior.error_rate:
+                self._json(500, {"error": {"message": "fake upstream error", "type": "server_error"}})
+                return
+
+            content = content_fn(body)
+            model = body.get("model", "fake-model")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            usage = {"prompt_tokens": 100, "completion_tokens": len(content) // 4, "total_tokens": 100 + len(content) // 4}
+
+            if not body.get("stream"):
+                self._json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for i in range(0, len(content), 16):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return Handler
+
+
+def serve(port: int, behavior: FakeBehavior, content_fn=completion_content) -> ThreadingHTTPServer:
+    "Start the fake server; call .serve_forever() (or run it in a thread)."
+    return ThreadingHTTPServer(("127.0.0.1", port), make_handler(behavior, content_fn))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.2, help="typical latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of slow responses")
+    parser.add_argument("--slow-delay", type=float, default=5.0, help="latency of slow responses (s)")
+    args = parser.parse_args()
+
+    server = serve(args.port, FakeBehavior(
+        delay=args.delay,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_delay=args.slow_delay,
+    ))
+    print(f"Fake OpenAI API on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,87 @@
+import math
+import os
+from typing import List, Tuple
+
+from temporal_aggregator import timestamp_seconds
+
+# Per-tier frame policy
+# - seconds_per_frame: sampling density before motion/load adjustments
+# - min/max: frame count bounds
+# - refine: extra frames allowed between frames whose objects differ
+TIERS = {
+    "fast": {"seconds_per_frame": 10.0, "min": 2, "max": 4, "refine": 0},
+    "balanced": {"seconds_per_frame": 4.0, "min": 4, "max": 8, "refine": 2},
+    "thorough": {"seconds_per_frame": 2.0, "min": 6, "max": 16, "refine": 4},
+}
+DEFAULT_TIER = os.getenv("VIDEO_FRAME_TIER", "balanced").strip().lower()
+# Absolute cap regardless of tier
+MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "16"))
+# Above this backend load, no refinement frames are added
+REFINE_MAX_LOAD = float(os.getenv("VIDEO_REFINE_MAX_LOAD", "0.8"))
+# Do not split gaps shorter than this
+REFINE_MIN_GAP_SECONDS = 0.5
+
+
+def resolve_tier(tier: str | None) -> str:
+    "Requested tier name, or the default for missing/unknown ones."
+    tier = (tier or "").strip().lower()
+    if tier in TIERS:
+        return tier
+    return DEFAULT_TIER if DEFAULT_TIER in TIERS else "balanced"
+
+
+def tier_policy(tier: str | None) -> dict:
+    return TIERS[resolve_tier(tier)]
+
+
+def choose_frame_count(duration: float, motion: float, tier: str | None, load: float) -> int:
+    """
+    Number of frames to sample up front.
+    - duration: clip length in seconds
+    - motion: 0 (static) .. 1 (lots of change), see estimate_motion()
+    - load: 0 (idle) .. 1 (saturated) backend utilization
+    """
+    policy = tier_policy(tier)
+    n = math.ceil(max(duration, 0.0) / policy["seconds_per_frame"])
+    # Busy scenes need denser sampling; static ones need less
+    n *= 0.75 + 0.5 * min(max(motion, 0.0), 1.0)
+    # Shed frames under load (up to half at saturation)
+    n *= 1.0 - 0.5 * min(max(load, 0.0), 1.0)
+    n = max(policy["min"], min(policy["max"], math.ceil(n)))
+    return max(1, min(n, MAX_FRAMES))
+
+
+def refine_budget(tier: str | None, load: float, used: int) -> int:
+    "Extra frames refinement may add on top of `used` frames."
+    if load >= REFINE_MAX_LOAD:
+        return 0
+    return max(0, min(tier_policy(tier)["refine"], MAX_FRAMES - used))
+
+
+def refine_targets(frame_results: List[Tuple[str, list]], budget: int) -> List[float]:
+    """
+    Times (seconds) worth sampling next: midpoints between neighbouring
+    sampled frames whose object sets differ, most different first.
+    `frame_results` is [(timestamp, objects)] in time order.
+    """
+    if budget <= 0:
+        return []
+    points = []
+    for timestamp, objects in frame_results:
+        t = timestamp_seconds(timestamp)
+        if t is not None:
+            points.append((t, {obj.key for obj in objects}))
+    points.sort(key=lambda p: p[0])
+
+    candidates = []
+    for (t1, names1), (t2, names2) in zip(points, points[1:]):
+        if t2 - t1 < REFINE_MIN_GAP_SECONDS:
+            continue
+        union = names1 | names2
+        if not union:
+            continue
+        change = 1.0 - len(names1 & names2) / len(union)
+        if change > 0:
+            candidates.append((change, t2 - t1, round((t1 + t2) / 2, 2)))
+    candidates.sort(reverse=True)
+    return [mid for _, _, mid in candidates[:budget]]
@@ -0,0 +1,102 @@
+import bisect
+import os
+import re
+import shutil
+import threading
+
+from temporal_aggregator import timestamp_seconds
+
+# Sampled video frames per session, kept on disk until the session ends
+BASE_DIR = os.path.dirname(__file__)
+FRAME_CACHE_DIR = os.path.join(BASE_DIR, "uploads", "frames")
+
+# session_id -> {"times": [float, ...] (sorted), "entries": [{timestamp, seconds, path, objects}]}
+FRAME_INDEX = {}
+_LOCK = threading.Lock()
+
+_TIME_PATTERNS = [
+    # 0:03 / 1:05.5
+    re.compile(r"\b(\d+):(\d{1,2}(?:\.\d+)?)\b"),
+    # 3s / 3.5 sec / 3 seconds
+    re.compile(r"\b(\d+(?:\.\d+)?)\s*(?:s|sec|secs|second|seconds)\b"),
+]
+
+
+def parse_time_reference(text: str) -> float | None:
+    """
+    Find a time the user refers to, e.g. "at 3 seconds", "around 2.5s",
+    "at 0:04". Returns seconds, or None if the text has no time.
+    """
+    t = (text or "").lower()
+    m = _TIME_PATTERNS[0].search(t)
+    if m:
+        return int(m.group(1)) * 60 + float(m.group(2))
+    m = _TIME_PATTERNS[1].search(t)
+    if m:
+        return float(m.group(1))
+    return None
+
+
+def _session_dir(session_id: str) -> str:
+    return os.path.join(FRAME_CACHE_DIR, session_id)
+
+
+def store_frames(session_id: str, frames: list, frame_results: list) -> None:
+    """
+    Keep a session's sampled frames (JPEG bytes) and per-frame objects.
+    `frames` is [(frame_bytes, timestamp)], `frame_results` is
+    [(timestamp, objects)], both in the order they were sampled.
+    """
+    objects_by_time = dict(frame_results)
+    session_dir = _session_dir(session_id)
+    os.makedirs(session_dir, exist_ok=True)
+
+    entries = []
+    for i, (frame_bytes, timestamp) in enumerate(frames):
+        seconds = timestamp_seconds(timestamp)
+        if seconds is None:
+            continue
+        path = os.path.join(session_dir, f"frame_{i:04d}.jpg")
+        with open(path, "wb") as f:
+            f.write(frame_bytes)
+        entries.append({
+            "timestamp": timestamp,
+            "seconds": seconds,
+            "path": path,
+            "objects": objects_by_time.get(timestamp, []),
+        })
+    entries.sort(key=lambda e: e["seconds"])
+    with _LOCK:
+        FRAME_INDEX[session_id] = {
+            "times": [e["seconds"] for e in entries],
+            "entries": entries,
+        }
+
+
+def lookup(session_id: str, seconds: float) -> dict | None:
+    """
+    Frame nearest to `seconds` (binary search over the sorted times).
+    Returns {timestamp, seconds, objects, frame_bytes} or None.
+    """
+    with _LOCK:
+        index = FRAME_INDEX.get(session_id)
+        if not index or not index["times"]:
+            return None
+        times = index["times"]
+        pos = bisect.bisect_left(times, seconds)
+        candidates = [i for i in (pos - 1, pos) if 0 <= i < len(times)]
+        best = min(candidates, key=lambda i: abs(times[i] - seconds))
+        entry = dict(index["entries"][best])
+    try:
+        with open(entry["path"], "rb") as f:
+            entry["frame_bytes"] = f.read()
+    except OSError:
+        return None
+    return entry
+
+
+def evict(session_id: str) -> None:
+    "Drop a session's frames (called when the session ends or expires)."
+    with _LOCK:
+        FRAME_INDEX.pop(session_id, None)
+    shutil.rmtree(_session_dir(session_id), ignore_errors=True)
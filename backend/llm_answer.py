@@ -1,95 +1,57 @@
 import os
-from openai import OpenAI
+import time
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from detections import DetectedObject, TemporalObject
+from prompt_builder import build_messages, record_usage
+from resilience import ANSWER
+from response_generator import generate_fallback_answer
+from startup import get_openai_client, load_env
+from traffic_capture import record_model_call
+
+load_env()
 
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
 
 
 def generate_natural_answer(
     question: str,
-    selected_object: dict,
+    selected_object: DetectedObject | TemporalObject,
     all_objects: list,
-    temporal: bool = False
+    temporal: bool = False,
+    history: list | None = None,
+    frame_timestamp: str | None = None,
 ):
     """
     Generate natural language answer for:
     - Static image object
     - Temporal (video) object
-    - Multi-turn follow-up
+    - Multi-turn follow-up (`history`: the session's [{role, text}] turns
+      before this question; windowed to a token budget)
+    - One moment of a video (`frame_timestamp`: `all_objects` are the
+      objects of the frame sampled then)
+    The prompt layout is built for prompt-prefix caching, see prompt_builder.py.
     """
 
     if not selected_object:
         return "I could not determine the selected object."
 
-    # Static object context
-    if not temporal:
-
-        name = selected_object.get("name", "object")
-        color = selected_object.get("color", "unknown")
-        position = selected_object.get("position", "unknown")
-        attributes = selected_object.get("attributes", [])
-
-        context = f"""
-You are answering a question about an object detected in an image.
-
-Selected Object:
-- Name: {name}
-- Color: {color}
-- Position: {position}
-- Attributes: {attributes}
-
-All detected objects in the scene:
-{all_objects}
-
-Answer the user's question clearly and concisely.
-If the question is a follow-up (e.g., "What color is it?"),
-refer to the selected object.
-"""
-
-    # Temporal object context
-    else:
-        name = selected_object.get("name", "object")
-        first_seen = selected_object.get("first_seen", "unknown")
-        last_seen = selected_object.get("last_seen", "unknown")
-        context = f"""
-You are answering a question about an object detected in a video.
+    messages = build_messages(
+        question, selected_object, all_objects, temporal, history, frame_timestamp
+    )
 
-Selected Temporal Object:
-- Name: {name}
-- First seen at: {first_seen}
-- Last seen at: {last_seen}
-
-All temporal objects detected in the video:
-{all_objects}
-
-Answer the user's question clearly.
-If the question refers to timing (e.g., when did it appear?),
-use the first_seen and last_seen information.
-"""
-
-    # Construct prompt
-    prompt = f"""
-{context}
-
-User Question:
-{question}
-
-Provide a helpful and natural response.
-Do not invent objects not in the context.
-"""
-
-    # Call AI model
+    # Call AI model (breaker + hedged attempts, see resilience.py)
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
+        response = ANSWER.call(lambda: get_openai_client().chat.completions.create(
             model=DEFAULT_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a helpful AI assistant."},
-                {"role": "user", "content": prompt},
-            ],
+            messages=messages,
             temperature=0.3,
-        )
-
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Error generating answer: {str(e)}"
+        ))
+        record_usage(getattr(response, "usage", None))
+        content = response.choices[0].message.content
+        record_model_call(DEFAULT_MODEL, messages, content, time.perf_counter() - started)
+
+        return content.strip()
+    except Exception:
+        # Upstream down or breaker open -> templated answer from the detections
+        return generate_fallback_answer(selected_object, all_objects, temporal)
@@ -1,16 +1,20 @@
 import base64
 import json
 import os
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Iterator
 
-from dotenv import load_dotenv
-from openai import OpenAI
+from detections import DetectedObject, parse_objects
+from partial_json import ArrayElementParser, salvage_array
+from resilience import VISION
+from startup import get_openai_client, load_env
+from traffic_capture import record_model_call
 
-load_dotenv()
-
-client = OpenAI()
+load_env()
 
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
+# "verbose" (SYSTEM_PROMPT) or "compact" (COMPACT_SYSTEM_PROMPT)
+DEFAULT_SCHEMA = os.getenv("OPENAI_VISION_SCHEMA", "verbose").strip().lower()
 
 SYSTEM_PROMPT = """You are an accessibility assistant.
 Your job: Given an image, output a structured object list for blind/low-vision users.
@@ -37,74 +41,194 @@ Guidelines:
 - If color not visible, use null.
 """
 
+# Short position codes used by the compact schema
+POSITION_CODES = {
+    "l": "left",
+    "m": "middle",
+    "r": "right",
+    "t": "top",
+    "b": "bottom",
+    "tl": "top-left",
+    "tr": "top-right",
+    "bl": "bottom-left",
+    "br": "bottom-right",
+}
+
+COMPACT_SYSTEM_PROMPT = """You are an accessibility assistant.
+Your job: Given an image, output a compact object list for blind/low-vision users.
+
+Return ONLY valid JSON (no markdown, no extra text, no spaces needed).
+The JSON must follow this structure:
+{"o":[[name,count,color,pos,[attrs]],...]}
+
+Each inner array is one object:
+- name: short string
+- count: int
+- color: short string or null
+- pos: one of "l","m","r","t","b","tl","tr","bl","br"
+- attrs: array of short strings, can be empty
+
+Guidelines:
+- Include all salient objects.
+- If count is unknown, guess a reasonable integer.
+- If color not visible, use null.
+"""
+
+def _expand_row(row: Any, idx: int) -> Dict[str, Any] | None:
+    "One compact row [name, count, color, pos, [attrs]] -> verbose object dict."
+    if not isinstance(row, list) or not row:
+        return None
+    row = row + [None] * (5 - len(row))
+    name, count, color, pos, attrs = row[:5]
+    pos_code = str(pos).strip().lower() if pos is not None else None
+    return {
+        "id": idx,
+        "name": name,
+        "count": count if count is not None else 1,
+        "color": color,
+        "position": POSITION_CODES.get(pos_code, pos),
+        "attributes": attrs if isinstance(attrs, list) else [],
+    }
+
+def expand_compact(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode the compact schema back into the verbose object dicts:
+    {"o": [[name, count, color, pos, [attrs]], ...]} -> {"objects": [...]}
+    """
+    rows = parsed.get("o")
+    if not isinstance(rows, list):
+        raise ValueError(f"JSON missing 'o' list. Got: {parsed}")
+    objects = []
+    for i, row in enumerate(rows, start=1):
+        obj = _expand_row(row, i)
+        if obj is not None:
+            objects.append(obj)
+    return {"objects": objects}
+
 def _to_data_url(image_bytes: bytes, mime: str) -> str:
     b64 = base64.b64encode(image_bytes).decode("utf-8")
     return f"data:{mime};base64,{b64}"
 
+def _build_messages(image_bytes: bytes, mime_type: str, question: str, compact: bool) -> list:
+    data_url = _to_data_url(image_bytes, mime_type)
+
+    user_text = f"""User question: {question}
+
+Task:
+1) Identify objects relevant for answering the question, but still include other salient objects.
+2) Produce the JSON object list as specified.
+"""
+
+    return [
+        {"role": "system", "content": COMPACT_SYSTEM_PROMPT if compact else SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_text},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": data_url},
+                },
+            ],
+        },
+    ]
+
 def analyze_image_to_objects(
     image_bytes: bytes,
     mime_type: str,
     question: str,
     model: str = DEFAULT_MODEL,
     max_tokens: int = 600,
+    schema: str = DEFAULT_SCHEMA,
 ) -> Dict[str, Any]:
     """
-    Calls OpenAI vision model and returns a parsed JSON dict:
-    { "objects": [...] }
+    Calls OpenAI vision model and returns a parsed dict:
+    { "objects": [DetectedObject, ...] }
+    schema="compact" asks for the short positional format
+    (far fewer output tokens) and expands it before validation.
+    Truncated output keeps its complete objects ("truncated": True).
     """
-    data_url = _to_data_url(image_bytes, mime_type)
-
-    user_text = f"""User question: {question}
+    compact = schema == "compact"
 
-Task:
-1) Identify objects relevant for answering the question, but still include other salient objects.
-2) Produce the JSON object list as specified.
-"""
-
-    resp = client.chat.completions.create(
+    messages = _build_messages(image_bytes, mime_type, question, compact)
+    started = time.perf_counter()
+    # Breaker + hedged attempts (see resilience.py)
+    resp = VISION.call(lambda: get_openai_client().chat.completions.create(
         model=model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": user_text},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": data_url},
-                    },
-                ],
-            },
-        ],
+        messages=messages,
         # JSON mode: ensures the output is valid JSON (not necessarily schema-perfect)
         response_format={"type": "json_object"},
         max_tokens=max_tokens,
         temperature=0.2,
-    )
+    ))
 
     content = resp.choices[0].message.content
+    record_model_call(model, messages, content, time.perf_counter() - started)
     try:
         parsed = json.loads(content)
     except json.JSONDecodeError as e:
-        raise ValueError(f"Model returned non-JSON content: {content[:200]}...") from e
+        # Usually a cut-off at max_tokens: keep the objects that did complete
+        elements = salvage_array(content, "o" if compact else "objects")
+        if elements is None:
+            raise ValueError(f"Model returned non-JSON content: {content[:200]}...") from e
+        parsed = {"o": elements} if compact else {"objects": elements}
+        parsed["truncated"] = True
+    if compact:
+        parsed = {**expand_compact(parsed), **{k: v for k, v in parsed.items() if k != "o"}}
 
     # Minimal validation + normalization
     if "objects" not in parsed or not isinstance(parsed["objects"], list):
         raise ValueError(f"JSON missing 'objects' list. Got: {parsed}")
 
-    # Ensure ids are ints starting at 1 (best-effort fix)
-    for i, obj in enumerate(parsed["objects"], start=1):
-        if not isinstance(obj, dict):
-            continue
-        obj["id"] = int(obj.get("id", i)) if str(obj.get("id", "")).isdigit() else i
-        if "count" in obj:
-            try:
-                obj["count"] = int(obj["count"])
-            except Exception:
-                obj["count"] = 1
-        else:
-            obj["count"] = 1
-        if "attributes" not in obj or not isinstance(obj["attributes"], list):
-            obj["attributes"] = []
-
+    # Single validation + normalization pass into typed objects
+    parsed["objects"] = parse_objects(parsed["objects"])
     return parsed
+
+def stream_image_objects(
+    image_bytes: bytes,
+    mime_type: str,
+    question: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 600,
+    schema: str = DEFAULT_SCHEMA,
+) -> Iterator[DetectedObject]:
+    """
+    Streaming version of analyze_image_to_objects.
+    Yields each DetectedObject as soon as the model has finished writing it;
+    if the completion is cut off, the complete objects are still yielded.
+    """
+    compact = schema == "compact"
+    parser = ArrayElementParser("o" if compact else "objects")
+
+    messages = _build_messages(image_bytes, mime_type, question, compact)
+    started = time.perf_counter()
+    # A stream cannot be hedged, but it still goes through the breaker;
+    # its latency is recorded once the stream has been fully read
+    stream = VISION.stream(lambda: get_openai_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format={"type": "json_object"},
+        max_tokens=max_tokens,
+        temperature=0.2,
+        stream=True,
+    ))
+
+    idx = 0
+    received = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if not text:
+            continue
+        received.append(text)
+        for element in parser.feed(text):
+            idx += 1
+            raw = _expand_row(element, idx) if compact else element
+            obj = DetectedObject.from_raw(raw, idx)
+            if obj is not None:
+                yield obj
+
+    record_model_call(model, messages, "".join(received), time.perf_counter() - started)
+    if not parser.found:
+        raise ValueError("Model stream did not contain an object list.")
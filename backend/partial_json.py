@@ -0,0 +1,102 @@
+import json
+import re
+from typing import Any, List
+
+
+class ArrayElementParser:
+    """
+    Incremental parser for model output shaped like {"<key>": [elem, ...], ...}.
+
+    Text is fed chunk by chunk; feed() returns each element of the
+    `key` array as soon as its closing bracket arrives, so callers can
+    use objects before the completion finishes. Works the same on
+    truncated text: everything complete before the cut is returned.
+    """
+
+    def __init__(self, key: str):
+        self._key_re = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._buf = ""
+        self._pos = 0              # next character to scan
+        self._found = False        # inside the target array
+        self._done = False         # target array closed
+        self._depth = 0            # nesting depth relative to the array
+        self._in_string = False
+        self._escape = False
+        self._start = None         # start offset of the current element
+
+    @property
+    def found(self) -> bool:
+        return self._found
+
+    @property
+    def complete(self) -> bool:
+        return self._done
+
+    def feed(self, text: str) -> List[Any]:
+        self._buf += text
+        out = []
+        if self._done:
+            return out
+        if not self._found:
+            m = self._key_re.search(self._buf)
+            if not m:
+                return out
+            self._found = True
+            self._pos = m.end()
+
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+                if self._start is None:
+                    self._start = i
+            elif ch in "{[":
+                if self._start is None:
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the target array itself
+                    self._done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._start:i + 1], out)
+                    self._start = None
+            elif ch == "," and self._depth == 0:
+                # End of a scalar element (rare; objects are containers)
+                if self._start is not None:
+                    self._emit(buf[self._start:i], out)
+                    self._start = None
+            elif not ch.isspace() and self._start is None:
+                self._start = i
+            i += 1
+        self._pos = i
+        return out
+
+    @staticmethod
+    def _emit(fragment: str, out: List[Any]) -> None:
+        try:
+            out.append(json.loads(fragment))
+        except json.JSONDecodeError:
+            pass
+
+
+def salvage_array(text: str, key: str) -> List[Any] | None:
+    """
+    Complete elements of the `key` array in possibly truncated JSON.
+    Returns None if the array never started.
+    """
+    parser = ArrayElementParser(key)
+    elements = parser.feed(text or "")
+    return elements if parser.found else None
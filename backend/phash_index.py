@@ -0,0 +1,218 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Hashable, Tuple
+
+from startup import import_timed
+
+# Opt-in: hashing costs an image decode (and a NumPy import) per request
+PHASH_ENABLED = os.getenv("PHASH_INDEX", "0").strip().lower() in ("1", "true", "yes")
+# Max Hamming distance (of 64 bits) for two uploads to count as the same scene
+PHASH_THRESHOLD = int(os.getenv("PHASH_THRESHOLD", "4"))
+PHASH_MAX_ENTRIES = int(os.getenv("PHASH_MAX_ENTRIES", "200000"))
+# Stored results expire, so the index never turns into a permanent cache
+PHASH_TTL_SECONDS = float(os.getenv("PHASH_TTL_SECONDS", "600"))
+
+HASH_BITS = 64
+_DCT_SIZE = 32
+_DCT_MATRIX = None
+
+
+def _dct_matrix(np):
+    "Orthonormal DCT-II basis, so dct2(X) = C @ X @ C.T"
+    global _DCT_MATRIX
+    if _DCT_MATRIX is None:
+        n = _DCT_SIZE
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        c = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        c[0, :] = np.sqrt(1.0 / n)
+        _DCT_MATRIX = c
+    return _DCT_MATRIX
+
+
+_PIL_MISSING = False
+
+
+def _grayscale_32(image_bytes: bytes, np):
+    """
+    Decode to a 32x32 grayscale float array.
+    Uses Pillow when installed so the image path does not pull in OpenCV;
+    falls back to cv2 otherwise. Returns None if the image does not decode.
+    """
+    global _PIL_MISSING
+    Image = None
+    if not _PIL_MISSING:
+        try:
+            Image = import_timed("PIL.Image")
+        except ImportError:
+            _PIL_MISSING = True
+    if Image is not None:
+        try:
+            with Image.open(BytesIO(image_bytes)) as img:
+                small = img.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.BOX)
+        except (OSError, ValueError):
+            return None
+        return np.asarray(small, dtype=np.float64)
+    cv2 = import_timed("cv2")
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return cv2.resize(img, (_DCT_SIZE, _DCT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float64)
+
+
+def compute_phash(image_bytes: bytes) -> int | None:
+    """
+    64-bit perceptual hash (pHash):
+    grayscale -> 32x32 -> 2D DCT -> top-left 8x8 low frequencies,
+    one bit per coefficient above the median (DC term excluded).
+    Robust to re-encoding, resizing and small crops/brightness changes.
+    Returns None if the image cannot be decoded.
+    """
+    np = import_timed("numpy")
+    small = _grayscale_32(image_bytes, np)
+    if small is None:
+        return None
+    c = _dct_matrix(np)
+    low = (c @ small @ c.T)[:8, :8].flatten()
+    median = np.median(low[1:])
+    bits = low > median
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+class PerceptualIndex:
+    """
+    Near-duplicate lookup over 64-bit hashes (multi-index hashing).
+
+    Each hash is split into threshold+1 chunks and each chunk is indexed
+    exactly. Two hashes within `threshold` bits must agree on at least
+    one chunk (pigeonhole), so a query only compares against entries that
+    share a chunk instead of scanning everything.
+    Each hash holds payloads per scope (e.g. question + model), since the
+    vision output depends on both. Payloads expire after `ttl` seconds
+    (each add() frees expired hashes from the old end) and the least
+    recently stored hashes are evicted past `max_entries`.
+    """
+
+    def __init__(
+        self,
+        threshold: int = PHASH_THRESHOLD,
+        max_entries: int = PHASH_MAX_ENTRIES,
+        ttl: float = PHASH_TTL_SECONDS,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        n_chunks = min(threshold + 1, HASH_BITS)
+        size, extra = divmod(HASH_BITS, n_chunks)
+        # (shift, mask) per chunk; the first `extra` chunks get one more bit
+        self._chunks = []
+        shift = 0
+        for j in range(n_chunks):
+            width = size + (1 if j < extra else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables = [dict() for _ in self._chunks]
+        # hash -> {scope: (stored_at, payload)}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0}
+
+    def _keys(self, h: int):
+        return [(h >> shift) & mask for shift, mask in self._chunks]
+
+    def _drop(self, h: int) -> None:
+        # Caller holds _lock
+        self._entries.pop(h, None)
+        for table, key in zip(self._tables, self._keys(h)):
+            bucket = table.get(key)
+            if bucket:
+                bucket.discard(h)
+                if not bucket:
+                    del table[key]
+
+    def add(self, h: int, scope: Hashable, payload: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            # _entries is in store order: expired hashes sit at the front
+            while self._entries:
+                oldest = next(iter(self._entries))
+                if now - max(t for t, _ in self._entries[oldest].values()) <= self.ttl:
+                    break
+                self._drop(oldest)
+            scopes = self._entries.get(h)
+            if scopes is None:
+                scopes = self._entries[h] = {}
+                for table, key in zip(self._tables, self._keys(h)):
+                    table.setdefault(key, set()).add(h)
+            scopes[scope] = (now, payload)
+            self._entries.move_to_end(h)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _fresh(self, h: int, scope: Hashable, now: float):
+        # Caller holds _lock; drops the scope (and the hash) once expired
+        scopes = self._entries.get(h)
+        entry = scopes.get(scope) if scopes else None
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl:
+            del scopes[scope]
+            if not scopes:
+                self._drop(h)
+            return None
+        return entry[1]
+
+    def nearest(self, h: int, scope: Hashable) -> Tuple[int, Any] | None:
+        "Closest unexpired entry for `scope` within the threshold: (distance, payload) or None."
+        now = time.monotonic()
+        with self._lock:
+            self.stats["lookups"] += 1
+            candidates = set()
+            for table, key in zip(self._tables, self._keys(h)):
+                candidates.update(table.get(key, ()))
+            best = None
+            for candidate in sorted(candidates, key=lambda c: (c ^ h).bit_count()):
+                d = (candidate ^ h).bit_count()
+                if d > self.threshold:
+                    break
+                payload = self._fresh(candidate, scope, now)
+                if payload is not None:
+                    best = (d, payload)
+                    break
+            if best is None:
+                return None
+            self.stats["hits"] += 1
+            return best
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": PHASH_ENABLED,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "entries": len(self._entries),
+                **self.stats,
+            }
+
+
+INDEX = PerceptualIndex()
+
+
+def find_similar(image_bytes: bytes, scope: Hashable) -> Tuple[int | None, Any]:
+    """
+    Returns (phash, payload stored for `scope` by a near-duplicate upload, or None).
+    phash is None when disabled or the image does not decode.
+    """
+    if not PHASH_ENABLED:
+        return None, None
+    h = compute_phash(image_bytes)
+    if h is None:
+        return None, None
+    match = INDEX.nearest(h, scope)
+    return h, (match[1] if match else None)
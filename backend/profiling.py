@@ -0,0 +1,102 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Profiling is off unless PROFILE_DIR is set
+PROFILE_DIR = os.getenv("PROFILE_DIR", "").strip()
+# Share of requests profiled without the header (0 = header only)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = "X-Profile"
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+
+# Only one cProfile may be active per process (Python 3.12+ raises otherwise)
+_CPROFILE_LOCK = threading.Lock()
+
+
+def should_profile(header_value: str | None) -> bool:
+    "Cheap gate evaluated per request; False whenever PROFILE_DIR is unset."
+    if not PROFILE_DIR:
+        return False
+    if header_value and header_value.strip().lower() in ("1", "true", "yes"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def safe_request_id(request_id: str) -> str:
+    "Request ids come from a header; keep them filename-safe."
+    return re.sub(r"[^A-Za-z0-9_-]", "", request_id or "")[:64] or "request"
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack at a fixed interval.
+    Produces collapsed stacks ("outer;inner;leaf count") for flamegraph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL_SECONDS):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+@contextmanager
+def profile_request(request_id: str):
+    """
+    Run the enclosed block under cProfile plus a stack sampler and write
+    <PROFILE_DIR>/<time>-<request_id>.pstats and .collapsed
+    While another request holds the profiler (or an outside profiler is
+    active), only the stack sampler runs and no .pstats is written.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(
+        PROFILE_DIR,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_request_id(request_id)}",
+    )
+    profiler = None
+    if _CPROFILE_LOCK.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is already registered
+            profiler = None
+            _CPROFILE_LOCK.release()
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    try:
+        yield base
+    finally:
+        sampler.stop()
+        if profiler is not None:
+            profiler.disable()
+            _CPROFILE_LOCK.release()
+            profiler.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w") as f:
+            f.write(sampler.collapsed())
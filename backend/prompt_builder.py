@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List
+
+# Token budget for the conversation history sent with a follow-up
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+# Old turns are dropped this many at a time, so the kept window (and the
+# prompt prefix before it) only shifts every few turns
+HISTORY_DROP_BLOCK = int(os.getenv("CHAT_HISTORY_DROP_BLOCK", "4"))
+SUMMARY_QUESTION_CHARS = 80
+
+# Static instructions first: identical bytes on every call, so the
+# provider's prompt-prefix cache can reuse them
+IMAGE_SYSTEM_PROMPT = """You are a helpful AI assistant for blind and low-vision users.
+You answer questions about objects detected in an image.
+The next message lists every detected object in the scene as JSON.
+Later messages hold the conversation so far and then the current question
+together with the selected object it is about.
+
+Answer the user's question clearly and concisely.
+If the question is a follow-up (e.g., "What color is it?"),
+refer to the selected object.
+Do not invent objects not in the context."""
+
+VIDEO_SYSTEM_PROMPT = """You are a helpful AI assistant for blind and low-vision users.
+You answer questions about objects detected in a video.
+The next message lists every temporal object detected in the video as JSON,
+with first_seen and last_seen times.
+Later messages hold the conversation so far and then the current question
+together with the selected object it is about.
+
+Answer the user's question clearly.
+If the question refers to timing (e.g., when did it appear?),
+use the first_seen and last_seen information.
+Do not invent objects not in the context."""
+
+# Follow-ups about one moment: the scene is a single sampled frame
+FRAME_SYSTEM_PROMPT = """You are a helpful AI assistant for blind and low-vision users.
+You answer questions about one moment in a video.
+The next message lists, as JSON, the objects detected in the single frame
+sampled at that moment; they carry no first_seen or last_seen times.
+Later messages hold the conversation so far and then the current question
+together with the selected object it is about, as tracked across the video.
+
+Answer the user's question about that moment clearly.
+Describe only what the frame shows.
+Do not invent objects not in the context."""
+
+_STATS = {
+    "calls": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "history_turns_sent": 0,
+    "history_turns_dropped": 0,
+}
+_STATS_LOCK = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    "Rough token count (~4 characters per token) for budgeting."
+    return len(text or "") // 4 + 1
+
+
+def scene_context(objects: List[Any], temporal: bool, frame_timestamp: str | None = None) -> str:
+    """
+    The session's fixed scene, serialized deterministically so the same
+    objects always produce the same bytes.
+    """
+    if frame_timestamp:
+        kind = f"Objects in the video frame at {frame_timestamp}"
+    elif temporal:
+        kind = "Temporal objects in the video"
+    else:
+        kind = "Objects in the scene"
+    body = json.dumps(
+        [obj.to_dict() for obj in objects],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return f"{kind}:\n{body}"
+
+
+def window_history(history: List[Dict[str, str]], budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    Fit the conversation under `budget` tokens.
+    Oldest turns are dropped in blocks of HISTORY_DROP_BLOCK; the user
+    questions among them are kept as a one-line summary.
+    Returns (summary or None, kept turns)
+    """
+    turns = [t for t in history or [] if t.get("text")]
+    # Once anything is dropped, a quarter of the budget goes to the summary
+    summary_budget = budget // 4
+    start = 0
+    while start < len(turns):
+        limit = budget if start == 0 else budget - summary_budget
+        if sum(estimate_tokens(t["text"]) for t in turns[start:]) <= limit:
+            break
+        start = min(len(turns), start + max(1, HISTORY_DROP_BLOCK))
+    dropped, kept = turns[:start], turns[start:]
+    if not dropped:
+        return None, kept
+
+    questions = [
+        t["text"][:SUMMARY_QUESTION_CHARS]
+        for t in dropped if t.get("role") == "user"
+    ]
+    summary = f"Earlier in this conversation ({len(dropped)} messages omitted)"
+    if questions:
+        summary += ", the user asked: " + " | ".join(questions)
+    return summary[:summary_budget * 4] or None, kept
+
+
+def selected_object_block(selected_object: Any, temporal: bool) -> str:
+    if temporal:
+        return (
+            "Selected Temporal Object:\n"
+            f"- Name: {selected_object.name}\n"
+            f"- First seen at: {selected_object.first_seen or 'unknown'}\n"
+            f"- Last seen at: {selected_object.last_seen or 'unknown'}"
+        )
+    return (
+        "Selected Object:\n"
+        f"- Name: {selected_object.name}\n"
+        f"- Color: {selected_object.color or 'unknown'}\n"
+        f"- Position: {selected_object.position or 'unknown'}\n"
+        f"- Attributes: {list(selected_object.attributes)}"
+    )
+
+
+def build_messages(
+    question: str,
+    selected_object: Any,
+    all_objects: List[Any],
+    temporal: bool = False,
+    history: List[Dict[str, str]] | None = None,
+    frame_timestamp: str | None = None,
+) -> List[Dict[str, str]]:
+    """
+    Chat messages laid out from most to least stable:
+    - static system instructions (same for every session of a type)
+    - the session's scene context (same for every turn of a session);
+      with `frame_timestamp`, the objects of that one video frame
+    - windowed history (grows at the end, shifts only in blocks)
+    - the selected object and current question (changes every turn)
+    """
+    if frame_timestamp:
+        system_prompt = FRAME_SYSTEM_PROMPT
+    else:
+        system_prompt = VIDEO_SYSTEM_PROMPT if temporal else IMAGE_SYSTEM_PROMPT
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": scene_context(all_objects, temporal, frame_timestamp)},
+    ]
+    summary, turns = window_history(history)
+    if summary:
+        messages.append({"role": "user", "content": summary})
+    for turn in turns:
+        role = "assistant" if turn.get("role") == "assistant" else "user"
+        messages.append({"role": role, "content": turn["text"]})
+    messages.append({"role": "user", "content": (
+        f"{selected_object_block(selected_object, temporal)}\n\n"
+        f"User Question:\n{question}\n\n"
+        "Provide a helpful and natural response."
+    )})
+
+    with _STATS_LOCK:
+        _STATS["history_turns_sent"] += len(turns)
+        _STATS["history_turns_dropped"] += len(history or []) - len(turns)
+    return messages
+
+
+def record_usage(usage: Any) -> None:
+    "Count prompt and prompt-cache hit tokens from a chat completion's usage."
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    with _STATS_LOCK:
+        _STATS["calls"] += 1
+        _STATS["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        _STATS["cached_tokens"] += getattr(details, "cached_tokens", 0) or 0
+
+
+def prompt_cache_metrics() -> dict:
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    stats["cache_hit_ratio"] = (
+        round(stats["cached_tokens"] / stats["prompt_tokens"], 3)
+        if stats["prompt_tokens"] else 0.0
+    )
+    stats["history_token_budget"] = HISTORY_TOKEN_BUDGET
+    return stats
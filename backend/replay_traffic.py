@@ -0,0 +1,397 @@
+"""
+Replay a captured traffic trace against the backend.
+
+Record a trace first (see traffic_capture.py):
+
+    TRAFFIC_CAPTURE_PATH=trace.jsonl TRAFFIC_CAPTURE_MEDIA_DIR=trace_media python app.py
+
+Then re-drive it, with the recorded model outputs standing in for OpenAI:
+
+    python replay_traffic.py trace.jsonl --media-dir trace_media --spawn-backend --out run1.jsonl
+    python replay_traffic.py trace.jsonl --media-dir trace_media --spawn-backend --speed 4 --out run2.jsonl --compare run1.jsonl
+
+Without --spawn-backend, start the backend yourself with
+OPENAI_BASE_URL=http://127.0.0.1:<fake-port>/v1 and pass --target.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_openai
+from traffic_capture import load_trace, request_key, result_summary
+
+BASE_DIR = os.path.dirname(__file__)
+REPLAYED_ROUTES = {"/analyze", "/clarify", "/chat"}
+
+
+class RecordedResponses:
+    """
+    content_fn for fake_openai that answers with the recorded model outputs.
+    - exact match on the request key (model + messages)
+    - otherwise the next unused output recorded for the same model
+      (e.g. media replaced or prompts changed since the capture)
+    - otherwise the fake server's canned reply
+    With replay_latency, each reply waits as long as the original call took.
+    """
+
+    def __init__(self, records, replay_latency: bool = True):
+        self.by_key = defaultdict(list)
+        self.by_model = defaultdict(deque)
+        for record in records:
+            for call in record.get("model_calls", []):
+                if "content" not in call:
+                    continue
+                self.by_key[call["key"]].append(call)
+                self.by_model[call["model"]].append(call)
+        self.replay_latency = replay_latency
+        self.stats = {"exact": 0, "by_model": 0, "canned": 0}
+        self._lock = threading.Lock()
+
+    def __call__(self, body: dict) -> str:
+        key = request_key(body.get("model"), body.get("messages", []))
+        with self._lock:
+            calls = self.by_key.get(key)
+            if calls:
+                call, kind = calls[0], "exact"
+            elif self.by_model.get(body.get("model")):
+                call, kind = self.by_model[body.get("model")].popleft(), "by_model"
+            else:
+                call, kind = None, "canned"
+            self.stats[kind] += 1
+        if call is None:
+            return fake_openai.completion_content(body)
+        if self.replay_latency:
+            time.sleep(call.get("latency_ms", 0) / 1000)
+        return call["content"]
+
+
+def _multipart(fields: dict, file_field: str, filename: str, data: bytes):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8") + data + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _last_sse_result(text: str):
+    "Payload of the final done/failed event of a server-sent events body."
+    result = None
+    event = None
+    for line in text.splitlines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: ") and event in ("done", "failed"):
+            try:
+                result = json.loads(line[len("data: "):])
+            except json.JSONDecodeError:
+                pass
+    return result
+
+
+def build_request(target: str, record: dict, session_map: dict, media_dir: str):
+    """
+    urllib Request for one trace record, or (None, reason) if it cannot
+    be replayed (media not kept, session never created in this run).
+    """
+    route = record["route"]
+    fields = record.get("request", {})
+    if route == "/analyze":
+        media = fields.get("media") or {}
+        path = os.path.join(media_dir or "", f"{media.get('sha256')}{media.get('ext', '')}")
+        if not media_dir or not os.path.exists(path):
+            return None, "media not available"
+        with open(path, "rb") as f:
+            data = f.read()
+        form = {
+            "question": fields.get("question") or "",
+            "mode": fields.get("mode") or "onepass",
+        }
+        if fields.get("tier"):
+            form["tier"] = fields["tier"]
+        for flag in ("async", "stream"):
+            if fields.get(flag):
+                form[flag] = "1"
+        body, content_type = _multipart(form, "image", f"upload{media.get('ext', '')}", data)
+    else:
+        session_id = session_map.get(fields.get("session_id"))
+        if not session_id:
+            return None, "session not created in this run"
+        payload = {k: v for k, v in fields.items() if k != "session_id"}
+        payload["session_id"] = session_id
+        body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    req = urllib.request.Request(
+        target.rstrip("/") + route,
+        data=body,
+        headers={"Content-Type": content_type},
+        method="POST",
+    )
+    return req, None
+
+
+def send(target: str, seq: int, record: dict, session_map: dict, media_dir: str, timeout: float) -> dict:
+    "Replay one record; returns {seq, route, status, latency_ms, ttfb_ms, result}."
+    result = {"seq": seq, "route": record["route"]}
+    req, skipped = build_request(target, record, session_map, media_dir)
+    if req is None:
+        return {**result, "skipped": skipped}
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status = resp.status
+            first = resp.read(1)
+            ttfb = time.perf_counter() - started
+            raw = first + resp.read()
+            content_type = resp.headers.get("Content-Type", "")
+    except urllib.error.HTTPError as e:
+        status = e.code
+        raw = e.read()
+        content_type = e.headers.get("Content-Type", "")
+    except OSError as e:
+        return {**result, "status": None, "error": str(e),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+    elapsed = time.perf_counter() - started
+
+    text = raw.decode("utf-8", errors="replace")
+    if content_type.startswith("text/event-stream"):
+        payload = _last_sse_result(text) or {}
+        summary = {"streamed": True, **result_summary(payload)}
+    else:
+        try:
+            summary = result_summary(json.loads(text))
+        except json.JSONDecodeError:
+            summary = {}
+    original_session = (record.get("result") or {}).get("session_id")
+    if original_session and summary.get("session_id"):
+        session_map[original_session] = summary["session_id"]
+    return {
+        **result,
+        "status": status,
+        "latency_ms": round(elapsed * 1000, 1),
+        "ttfb_ms": round(ttfb * 1000, 1) if ttfb is not None else None,
+        "result": summary,
+    }
+
+
+def replay(records, target: str, speed: float = 1.0, media_dir: str = "",
+           concurrency: int = 32, timeout: float = 300.0):
+    """
+    Re-send the trace at its original pacing divided by `speed`
+    (speed <= 0: as fast as possible). Requests of one session run in
+    their recorded order, each after the previous one finished, so
+    /clarify and /chat find the session their /analyze created.
+    Returns results in trace order.
+    """
+    records = [r for r in records if r.get("route") in REPLAYED_ROUTES]
+    if not records:
+        return []
+    session_map = {}
+    # Original session id -> event set when its latest request finished
+    session_tail = {}
+    t0 = records[0].get("ts", 0)
+    started = time.perf_counter()
+
+    def run(seq, record, wait_for, done):
+        try:
+            if wait_for is not None:
+                wait_for.wait()
+            return send(target, seq, record, session_map, media_dir, timeout)
+        finally:
+            done.set()
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seq, record in enumerate(records):
+            if speed > 0:
+                due = (record.get("ts", t0) - t0) / speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            session = (
+                (record.get("request") or {}).get("session_id")
+                or (record.get("result") or {}).get("session_id")
+            )
+            done = threading.Event()
+            wait_for = session_tail.get(session) if session else None
+            if session:
+                session_tail[session] = done
+            futures.append(pool.submit(run, seq, record, wait_for, done))
+    return [f.result() for f in futures]
+
+
+def percentile(values, q: float):
+    "Nearest-rank percentile (q in 0..100) of a list of numbers."
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def latency_report(rows, field: str = "latency_ms") -> dict:
+    "{route: {count, errors, skipped, p50, p90, p99, max, mean}} in ms"
+    by_route = defaultdict(list)
+    for row in rows:
+        by_route[row["route"]].append(row)
+    report = {}
+    for route, items in sorted(by_route.items()):
+        values = [r[field] for r in items if r.get(field) is not None and not r.get("skipped")]
+        report[route] = {
+            "count": len(items),
+            "errors": sum(1 for r in items if not r.get("skipped") and (r.get("status") or 500) >= 400),
+            "skipped": sum(1 for r in items if r.get("skipped")),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else None,
+            "mean": round(sum(values) / len(values), 1) if values else None,
+        }
+    return report
+
+
+def diff_runs(baseline, current) -> dict:
+    """
+    Per-request differences between two runs (matched by trace position):
+    status changes and answer changes, plus per-route percentile deltas.
+    """
+    changes = []
+    for before, after in zip(baseline, current):
+        if before.get("skipped") or after.get("skipped"):
+            continue
+        b_result, a_result = before.get("result") or {}, after.get("result") or {}
+        if before.get("status") != after.get("status"):
+            changes.append({"seq": after["seq"], "route": after["route"], "change": "status",
+                            "before": before.get("status"), "after": after.get("status")})
+        elif (
+            b_result.get("answer_sha1") and a_result.get("answer_sha1")
+            and b_result["answer_sha1"] != a_result["answer_sha1"]
+        ):
+            changes.append({"seq": after["seq"], "route": after["route"], "change": "answer"})
+
+    b_report, a_report = latency_report(baseline), latency_report(current)
+    latency = {}
+    for route in sorted(set(b_report) | set(a_report)):
+        latency[route] = {
+            p: (
+                round(a_report[route][p] - b_report[route][p], 1)
+                if a_report.get(route, {}).get(p) is not None
+                and b_report.get(route, {}).get(p) is not None
+                else None
+            )
+            for p in ("p50", "p90", "p99", "mean")
+        }
+    return {"changed_requests": changes, "latency_delta_ms": latency}
+
+
+def trace_as_results(records) -> list:
+    "The original trace in the same shape as replay results, for comparison."
+    return [
+        {
+            "seq": seq,
+            "route": r["route"],
+            "status": r.get("status"),
+            "latency_ms": r.get("elapsed_ms"),
+            "result": r.get("result") or {},
+        }
+        for seq, r in enumerate(x for x in records if x.get("route") in REPLAYED_ROUTES)
+    ]
+
+
+def spawn_backend(port: int, fake_port: int) -> subprocess.Popen:
+    "Start app.py on `port` with OpenAI pointed at the fake server; waits until it answers."
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "replay"),
+        # Do not record the replay itself
+        "TRAFFIC_CAPTURE_PATH": "",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-c", f"import app; app.app.run(port={port}, threaded=True)"],
+        cwd=BASE_DIR,
+        env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Backend did not start within 60s")
+
+
+def _load_results(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace", help="JSONL trace written with TRAFFIC_CAPTURE_PATH")
+    parser.add_argument("--target", default="http://127.0.0.1:5000", help="backend base URL")
+    parser.add_argument("--media-dir", default="", help="TRAFFIC_CAPTURE_MEDIA_DIR of the capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="rate multiplier (0 = no pacing)")
+    parser.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout (s)")
+    parser.add_argument("--fake-port", type=int, default=8001, help="port of the OpenAI stand-in")
+    parser.add_argument("--no-model-latency", action="store_true", help="answer model calls instantly")
+    parser.add_argument("--spawn-backend", type=int, nargs="?", const=5055, default=None,
+                        metavar="PORT", help="start app.py on PORT (default 5055) for the run")
+    parser.add_argument("--out", default="", help="write per-request results (JSONL)")
+    parser.add_argument("--compare", default="", help="earlier --out file to diff against")
+    args = parser.parse_args()
+
+    records = load_trace(args.trace)
+    responder = RecordedResponses(records, replay_latency=not args.no_model_latency)
+    fake = fake_openai.serve(args.fake_port, fake_openai.FakeBehavior(delay=0.0, jitter=0.0), responder)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    backend = None
+    target = args.target
+    if args.spawn_backend is not None:
+        backend = spawn_backend(args.spawn_backend, args.fake_port)
+        target = f"http://127.0.0.1:{args.spawn_backend}"
+    try:
+        results = replay(records, target, args.speed, args.media_dir, args.concurrency, args.timeout)
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait()
+        fake.shutdown()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for row in results:
+                f.write(json.dumps(row) + "\n")
+
+    report = {
+        "requests": len(results),
+        "model_responses": responder.stats,
+        "latency_ms": latency_report(results),
+        "ttfb_ms": latency_report(results, "ttfb_ms"),
+        "vs_capture": diff_runs(trace_as_results(records), results),
+    }
+    if args.compare:
+        report["vs_baseline"] = diff_runs(_load_results(args.compare), results)
+    print(json.dumps(report, indent=2))
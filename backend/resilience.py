@@ -0,0 +1,355 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+HEDGE_ENABLED = os.getenv("OPENAI_HEDGE", "1").strip().lower() in ("1", "true", "yes")
+# Fire the second attempt once the first is slower than this latency percentile
+HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+# No hedging until we have this many latency samples
+HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+# Hedge budget: each call earns this many hedge tokens, a hedge spends one
+HEDGE_BUDGET = float(os.getenv("OPENAI_HEDGE_BUDGET", "0.05"))
+HEDGE_BURST = float(os.getenv("OPENAI_HEDGE_BURST", "2"))
+# No hedging while this share of recent calls is already slow (upstream overloaded)
+HEDGE_MAX_SLOW_RATE = float(os.getenv("OPENAI_HEDGE_MAX_SLOW_RATE", "0.2"))
+HEDGE_THREADS = int(os.getenv("OPENAI_HEDGE_THREADS", "16"))
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "20"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+# Runs hedge attempts only; first attempts never queue here
+_EXECUTOR = ThreadPoolExecutor(max_workers=HEDGE_THREADS)
+_HEDGES_RUNNING = 0
+_HEDGES_LOCK = threading.Lock()
+
+
+def _hedge_pool_busy() -> bool:
+    with _HEDGES_LOCK:
+        return _HEDGES_RUNNING >= HEDGE_THREADS
+
+
+def _submit_hedge(fn: Callable[[], Any]) -> Future:
+    global _HEDGES_RUNNING
+    with _HEDGES_LOCK:
+        _HEDGES_RUNNING += 1
+
+    def finished(_future) -> None:
+        global _HEDGES_RUNNING
+        with _HEDGES_LOCK:
+            _HEDGES_RUNNING -= 1
+
+    future = _EXECUTOR.submit(fn)
+    future.add_done_callback(finished)
+    return future
+
+
+class CircuitOpen(Exception):
+    "Raised instead of calling upstream while a breaker is open."
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} upstream unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    "Recent call latencies, for hedge delays and metrics."
+
+    def __init__(self, size: int = 200):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+    def percentile(self, pct: float) -> float | None:
+        with self._lock:
+            if not self._values:
+                return None
+            ordered = sorted(self._values)
+        idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+class HedgeBudget:
+    "Token bucket refilled by calls: each call adds `ratio` tokens, a hedge spends one."
+
+    def __init__(self, ratio: float = HEDGE_BUDGET, burst: float = HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def available(self) -> bool:
+        with self._lock:
+            return self._tokens >= 1
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    closed -> open when, over the last `window` calls, the error rate or
+    the share of slow calls crosses its threshold;
+    open -> half_open after `open_seconds` (one trial call allowed);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_seconds: float = BREAKER_SLOW_SECONDS,
+        slow_rate: float = BREAKER_SLOW_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._calls = deque(maxlen=window)   # (ok, elapsed)
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.stats = {"trips": 0, "short_circuited": 0}
+
+    def before_call(self) -> None:
+        "Raise CircuitOpen unless a call may go upstream now."
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self.stats["short_circuited"] += 1
+                    raise CircuitOpen(self.name, max(1, int(remaining + 0.999)))
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open":
+                if self._trial_running:
+                    self.stats["short_circuited"] += 1
+                    raise CircuitOpen(self.name, 1)
+                self._trial_running = True
+
+    def record(self, ok: bool, elapsed: float) -> None:
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_running = False
+                if ok and elapsed < self.slow_seconds:
+                    self.state = "closed"
+                    self._calls.clear()
+                else:
+                    self._trip()
+                return
+            self._calls.append((ok, elapsed))
+            if self.state != "closed" or len(self._calls) < self.min_calls:
+                return
+            n = len(self._calls)
+            errors = sum(1 for good, _ in self._calls if not good)
+            slow = sum(1 for _, t in self._calls if t >= self.slow_seconds)
+            if errors / n >= self.error_rate or slow / n >= self.slow_rate:
+                self._trip()
+
+    def slow_share(self) -> float:
+        "Share of the recent calls that were slow."
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(1 for _, t in self._calls if t >= self.slow_seconds) / len(self._calls)
+
+    def release(self) -> None:
+        "A call ended without a verdict (e.g. an abandoned stream): free the half-open trial slot."
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_running = False
+
+    def _trip(self) -> None:
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.stats["trips"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, **self.stats}
+
+
+class Upstream:
+    "Breaker, latency tracking and hedging for one upstream call site."
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self.budget = HedgeBudget()
+        self.stats = {"calls": 0, "errors": 0, "hedged": 0, "hedge_wins": 0, "hedges_skipped": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _may_hedge(self) -> bool:
+        "Budget left, hedge pool not saturated, upstream not already slow."
+        return (
+            self.budget.available()
+            and not _hedge_pool_busy()
+            and self.breaker.slow_share() < HEDGE_MAX_SLOW_RATE
+        )
+
+    def hedge_delay(self) -> float | None:
+        "Seconds to wait before hedging, or None to not hedge."
+        if not HEDGE_ENABLED or self.latency.count() < HEDGE_MIN_SAMPLES:
+            return None
+        if not self._may_hedge():
+            return None
+        return self.latency.percentile(HEDGE_PERCENTILE)
+
+    def _attempt(self, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        result = fn()
+        self.latency.add(time.perf_counter() - started)
+        return result
+
+    def call(self, fn: Callable[[], Any], hedge: bool = True) -> Any:
+        """
+        Call fn() through the breaker.
+        With hedging, a second attempt starts if the first one is still
+        running after hedge_delay(); the first successful result wins.
+        Hedges are capped by a budget of about HEDGE_BUDGET per call.
+        """
+        self.breaker.before_call()
+        self._count("calls")
+        self.budget.deposit()
+        started = time.perf_counter()
+        try:
+            delay = self.hedge_delay() if hedge else None
+            if delay is None:
+                result = self._attempt(fn)
+            else:
+                result = self._hedged(fn, delay)
+        except Exception:
+            self._count("errors")
+            self.breaker.record(False, time.perf_counter() - started)
+            raise
+        self.breaker.record(True, time.perf_counter() - started)
+        return result
+
+    def stream(self, fn: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        """
+        Call fn() through the breaker and yield from the stream it returns.
+        Streams are never hedged. Latency and the breaker outcome are
+        recorded once the stream is fully read, counting only the time
+        spent waiting on upstream, so they compare with non-streamed calls.
+        """
+        self.breaker.before_call()
+        self._count("calls")
+        waited = 0.0
+        try:
+            started = time.perf_counter()
+            chunks = iter(fn())
+            waited += time.perf_counter() - started
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    waited += time.perf_counter() - started
+                    break
+                waited += time.perf_counter() - started
+                yield chunk
+        except GeneratorExit:
+            # Consumer stopped reading (e.g. client disconnected)
+            self.breaker.release()
+            raise
+        except Exception:
+            self._count("errors")
+            self.breaker.record(False, waited + time.perf_counter() - started)
+            raise
+        self.latency.add(waited)
+        self.breaker.record(True, waited)
+
+    def _hedged(self, fn: Callable[[], Any], delay: float) -> Any:
+        # The first attempt gets its own thread (never the shared pool),
+        # so the hedge delay is not eaten up by queueing under load
+        first = Future()
+
+        def run_first() -> None:
+            try:
+                first.set_result(self._attempt(fn))
+            except BaseException as e:
+                first.set_exception(e)
+
+        threading.Thread(target=run_first, name=f"{self.name}-attempt", daemon=True).start()
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        # Conditions may have changed while waiting
+        if not (self._may_hedge() and self.budget.try_spend()):
+            self._count("hedges_skipped")
+            return first.result()
+
+        self._count("hedged")
+        second = _submit_hedge(lambda: self._attempt(fn))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    # The slower attempt keeps running; its result is dropped
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "breaker": self.breaker.snapshot(),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+        }
+
+
+VISION = Upstream("vision")
+ANSWER = Upstream("answer")
+
+
+def resilience_metrics() -> dict:
+    return {
+        "hedge_enabled": HEDGE_ENABLED,
+        "hedge_percentile": HEDGE_PERCENTILE,
+        "hedge_budget": HEDGE_BUDGET,
+        "vision": VISION.snapshot(),
+        "answer": ANSWER.snapshot(),
+    }
@@ -1,25 +1,36 @@
 from typing import List, Dict, Any
 from collections import defaultdict
 
+from detections import DetectedObject, TemporalObject
 
-def _norm(s: str) -> str:
-    return (s or "").strip()
 
-
-def group_objects(objects: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+def group_objects(objects: List[DetectedObject]) -> Dict[str, List[DetectedObject]]:
     """
     Group objects by name (type).
     """
     groups = defaultdict(list)
     for obj in objects:
-        name = _norm(obj.get("name", "object")).lower()
-        if not name:
-            name = "object"
-        groups[name].append(obj)
+        groups[obj.key].append(obj)
     return dict(groups)
 
 
-def format_grouped_description(groups: Dict[str, List[Dict[str, Any]]]) -> str:
+def format_object_details(obj: DetectedObject) -> str:
+    """
+    Short detail string for one object, e.g. "Item 2, red, at left, ceramic".
+    """
+    detail_parts = [f"Item {obj.id}"]
+    if obj.count and obj.count != 1:
+        detail_parts.append(f"count {obj.count}")
+    if obj.color:
+        detail_parts.append(obj.color)
+    if obj.position:
+        detail_parts.append(f"at {obj.position}")
+    # keep attributes short to be screen-reader friendly
+    detail_parts.extend(obj.attributes[:3])
+    return ", ".join(detail_parts)
+
+
+def format_grouped_description(groups: Dict[str, List[DetectedObject]]) -> str:
     """
     Human/screen-reader-friendly grouped description:
     - First provide totals
@@ -37,36 +48,14 @@ def format_grouped_description(groups: Dict[str, List[Dict[str, Any]]]) -> str:
         lines.append(f"{name.title()}s ({len(objs)}):")
 
         for obj in objs:
-            obj_id = obj.get("id")
-            count = obj.get("count", 1)
-            color = obj.get("color")
-            pos = obj.get("position")
-            attrs = obj.get("attributes", [])
-
-            detail_parts = []
-            if obj_id is not None:
-                detail_parts.append(f"Item {obj_id}")
-            if count and int(count) != 1:
-                detail_parts.append(f"count {count}")
-            if color and str(color).lower() not in ["none", "null"]:
-                detail_parts.append(str(color))
-            if pos and str(pos).lower() != "unknown":
-                detail_parts.append(f"at {pos}")
-            if attrs and isinstance(attrs, list):
-                # keep attributes short to be screen-reader friendly
-                detail_parts.extend([str(a) for a in attrs[:3]])
-
-            if detail_parts:
-                lines.append("- " + ", ".join(detail_parts))
-            else:
-                lines.append("- (no additional details)")
+            lines.append("- " + format_object_details(obj))
 
         lines.append("")
 
     return "\n".join(lines).strip()
 
 
-def generate_onepass_response(objects: List[Dict[str, Any]], ambiguity: Dict[str, Any] = None) -> str:
+def generate_onepass_response(objects: List[DetectedObject], ambiguity: Dict[str, Any] = None) -> str:
     """
     One-pass exhaustive response:
     - Explicitly acknowledge ambiguity if present
@@ -100,8 +89,8 @@ def generate_onepass_response(objects: List[Dict[str, Any]], ambiguity: Dict[str
 
 def generate_final_answer_grouped(
     question: str,
-    selected_object: Dict[str, Any],
-    all_objects: List[Dict[str, Any]],
+    selected_object: DetectedObject,
+    all_objects: List[DetectedObject],
     ambiguity: Dict[str, Any] = None
 ) -> str:
     """
@@ -113,24 +102,13 @@ def generate_final_answer_grouped(
     if not selected_object:
         return "I could not determine the selected object."
 
-    name = selected_object.get("name", "object")
-    color = selected_object.get("color")
-    pos = selected_object.get("position")
-    obj_id = selected_object.get("id")
-
-    parts = []
-    if obj_id is not None:
-        parts.append(f"{name} (item {obj_id})")
-    else:
-        parts.append(f"{name}")
-
     details = []
-    if color and str(color).lower() not in ["none", "null"]:
-        details.append(str(color))
-    if pos and str(pos).lower() != "unknown":
-        details.append(f"at {pos}")
+    if selected_object.color:
+        details.append(selected_object.color)
+    if selected_object.position:
+        details.append(f"at {selected_object.position}")
 
-    answer = f"You selected the {parts[0]}."
+    answer = f"You selected the {selected_object.name} (item {selected_object.id})."
     if details:
         answer += " It is " + ", ".join(details) + "."
 
@@ -146,3 +124,28 @@ def generate_final_answer_grouped(
     answer += " Context: " + ", ".join(summary) + "."
 
     return answer
+
+
+def format_temporal_line(obj: TemporalObject) -> str:
+    "One spoken line describing when a temporal object appears."
+    if obj.first_seen == obj.last_seen:
+        return f"{obj.name} appears at {obj.first_seen}."
+    return f"{obj.name} appears from {obj.first_seen} to {obj.last_seen}."
+
+
+def generate_fallback_answer(
+    selected_object,
+    all_objects: list,
+    temporal: bool = False
+) -> str:
+    """
+    Templated answer used when the answer model is unavailable:
+    describes the selected object from the detections alone.
+    """
+    if temporal:
+        lines = [format_temporal_line(selected_object)]
+        others = [o for o in all_objects if o is not selected_object]
+        if others:
+            lines.append("Also in the video: " + ", ".join(o.name for o in others) + ".")
+        return " ".join(lines)
+    return generate_final_answer_grouped("", selected_object, all_objects)
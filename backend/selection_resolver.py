@@ -0,0 +1,164 @@
+import re
+from typing import Any, Dict, List, Set
+
+from temporal_aggregator import timestamp_seconds
+
+_WORD = re.compile(r"[a-z0-9]+")
+_OBJECT_ID = re.compile(r"#\s*(\d+)")
+
+# Spoken position words -> the vocabulary the vision model uses
+POSITION_SYNONYMS = {
+    "centre": "middle",
+    "center": "middle",
+    "central": "middle",
+    "upper": "top",
+    "lower": "bottom",
+    "leftmost": "left",
+    "rightmost": "right",
+}
+
+ORDINALS = {
+    "first": 0, "1st": 0,
+    "second": 1, "2nd": 1,
+    "third": 2, "3rd": 2,
+    "fourth": 3, "4th": 3,
+    "fifth": 4, "5th": 4,
+    "sixth": 5, "6th": 5,
+    "last": -1, "final": -1,
+    # Video sessions: order of first appearance
+    "earliest": 0, "latest": -1,
+}
+
+# Words that carry no object description; any other word that matches no
+# option (e.g. "plate" when only cups were offered) rules out a match,
+# unless the selection also names an offered object ("the cup by the laptop")
+FILLER_WORDS = {
+    "a", "an", "the", "this", "that", "these", "those", "it", "its",
+    "one", "ones", "object", "thing", "item",
+    "i", "me", "my", "we", "you", "mean", "meant", "want", "choose", "pick",
+    "select", "please", "just", "like", "is", "was", "s",
+    "on", "in", "at", "of", "to", "from", "by", "near", "side", "part",
+    "and", "or", "with", "color", "colored", "coloured", "looking",
+}
+
+
+def _norm(text: str) -> str:
+    return " ".join((text or "").lower().replace("–", "-").split())
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def _singular(word: str) -> str:
+    if len(word) > 3 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    if len(word) > 2 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+class SelectionResolver:
+    """
+    Maps a clarify selection back to one of the offered options.
+
+    Built once when the clarify session is created, from the exact
+    option labels and the objects behind them:
+    - exact: normalized option label -> object index (dict lookup)
+    - fuzzy: word -> candidate set per dimension (name, color, position),
+      intersected for spoken variants like "the red one", "the left cup";
+      ordinals ("the second cup") pick from what remains, in option
+      order for images and by first appearance for video
+    Indices refer to the session's `objects` list.
+    """
+
+    def __init__(self, options: List[str], option_indices: List[int], objects: List[Any]):
+        self.labels: Dict[int, str] = dict(zip(option_indices, options))
+        self.exact: Dict[str, int] = {}
+        self.by_id: Dict[int, int] = {}
+        self.names: Dict[str, Set[int]] = {}
+        self.colors: Dict[str, Set[int]] = {}
+        self.positions: Dict[str, Set[int]] = {}
+        self.order: List[int] = list(option_indices)
+        # Words of the offered labels (e.g. times in "cup at 1.5s"); they
+        # do not narrow the match, but are not unknown either
+        self.label_words: Set[str] = set()
+
+        for label, index in zip(options, option_indices):
+            self.exact[_norm(label)] = index
+            self.label_words.update(_words(label))
+            obj = objects[index]
+            if getattr(obj, "id", None) is not None:
+                self.by_id[obj.id] = index
+            for word in _words(obj.name):
+                self.names.setdefault(_singular(word), set()).add(index)
+            for word in _words(getattr(obj, "color", None)):
+                self.colors.setdefault(word, set()).add(index)
+            for word in _words(getattr(obj, "position", None)):
+                self.positions.setdefault(word, set()).add(index)
+
+        # Video options: ordinals follow first appearance
+        if objects and hasattr(objects[0], "first_seen"):
+            self.order.sort(key=lambda i: timestamp_seconds(objects[i].first_seen) or 0.0)
+
+    def resolve(self, selection: str) -> int | None:
+        "Object index for the selection, or None if it matches none or several."
+        index = self.exact.get(_norm(selection))
+        if index is not None:
+            return index
+
+        m = _OBJECT_ID.search(selection or "")
+        if m and int(m.group(1)) in self.by_id:
+            return self.by_id[int(m.group(1))]
+
+        candidates = self.match(selection)
+        if len(candidates) == 1:
+            return candidates[0]
+        return None
+
+    def match(self, selection: str) -> List[int]:
+        """
+        Options consistent with every name/color/position/ordinal word in
+        the selection. Other words may describe the surroundings ("the cup
+        on the table"), but if no offered object is named at all, an
+        unknown word ("the blue plate" when only cups were offered) means
+        the selection matches nothing.
+        """
+        candidates = set(self.order)
+        ordinal = None
+        named = False
+        unknown = False
+        for word in _words(selection):
+            word = POSITION_SYNONYMS.get(word, word)
+            for table in (self.names, self.colors, self.positions):
+                key = _singular(word) if table is self.names else word
+                if key in table:
+                    candidates &= table[key]
+                    named = named or table is self.names
+                    break
+            else:
+                if word in ORDINALS:
+                    ordinal = ORDINALS[word]
+                elif word not in FILLER_WORDS and word not in self.label_words:
+                    unknown = True
+        if unknown and not named:
+            return []
+        ordered = [i for i in self.order if i in candidates]
+        if ordinal is not None and ordered:
+            if -len(ordered) <= ordinal < len(ordered):
+                return [ordered[ordinal]]
+            return []
+        return ordered
+
+    def remaining_options(self, selection: str) -> List[str]:
+        "Labels still consistent with a selection that did not resolve (all of them if none is)."
+        return [self.labels[i] for i in self.match(selection) or self.order]
+
+
+def build_resolver(ambiguity: Dict[str, Any], objects: List[Any]) -> SelectionResolver:
+    "Resolver for the options a clarify response offered."
+    return SelectionResolver(
+        ambiguity.get("options", []),
+        ambiguity.get("option_indices", []),
+        objects,
+    )
@@ -6,12 +6,40 @@ SESSIONS = {}
 
 DEFAULT_TTL_SECONDS = 15 * 60  # 15 minutes
 
+# Callbacks run with the session_id when a session ends or expires
+# (e.g. to drop per-session caches)
+EVICTION_HOOKS = []
+
 
 def _now() -> float:
     return time.time()
 
 
+def on_session_evicted(hook) -> None:
+    EVICTION_HOOKS.append(hook)
+
+
+def _evict(session_id: str) -> None:
+    for hook in EVICTION_HOOKS:
+        hook(session_id)
+
+
+def purge_expired() -> int:
+    "Remove expired or ended sessions and run eviction hooks for them."
+    now = _now()
+    stale = [
+        sid for sid, s in list(SESSIONS.items())
+        if not s.get("active", False) or s.get("expires_at", 0) < now
+    ]
+    for sid in stale:
+        SESSIONS.pop(sid, None)
+        _evict(sid)
+    return len(stale)
+
+
 def create_session(data: dict, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> str:
+    # Opportunistic cleanup so expired sessions do not pile up
+    purge_expired()
     session_id = str(uuid.uuid4())
     expires_at = _now() + ttl_seconds
 
@@ -33,6 +61,7 @@ def get_session(session_id: str) -> dict | None:
     # expire check
     if s.get("expires_at", 0) < _now():
         s["active"] = False
+        _evict(session_id)
         return None
     if not s.get("active", False):
         return None
@@ -44,6 +73,7 @@ def end_session(session_id: str) -> bool:
     if not s:
         return False
     s["active"] = False
+    _evict(session_id)
     return True
 
 
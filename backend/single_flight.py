@@ -0,0 +1,65 @@
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+# In-flight calls keyed by caller-chosen keys (prototype, per worker process).
+_LOCK = threading.Lock()
+_IN_FLIGHT: Dict[Hashable, "_Call"] = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def do(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """
+    Run fn() at most once at a time per key.
+
+    - The first caller for a key runs fn() itself
+    - Callers arriving while that call is running wait for it
+      and receive a copy of the same result (or the same exception)
+    - Once the call finishes the key is released, so later callers
+      start a fresh call (this is coalescing, not caching)
+    """
+    with _LOCK:
+        call = _IN_FLIGHT.get(key)
+        if call is not None:
+            call.waiters += 1
+            leader = False
+        else:
+            call = _Call()
+            _IN_FLIGHT[key] = call
+            leader = True
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        # Followers get their own copy so nobody mutates a shared result
+        return copy.deepcopy(call.result)
+
+    result = None
+    try:
+        result = fn()
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _LOCK:
+            _IN_FLIGHT.pop(key, None)
+            waiters = call.waiters
+        if waiters and call.error is None:
+            # Snapshot before the leader's caller can touch the result
+            call.result = copy.deepcopy(result)
+        call.done.set()
+    return result
+
+
+def in_flight_count() -> int:
+    "Number of distinct keys currently being computed."
+    with _LOCK:
+        return len(_IN_FLIGHT)
@@ -0,0 +1,100 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds spent in each one-off startup step, in the order they ran
+STARTUP_TIMINGS = {}
+
+_LOCK = threading.RLock()
+_ENV_LOADED = False
+_CLIENT = None
+# Modules import_timed() has fully imported
+_IMPORTED = set()
+
+
+@contextmanager
+def timed(step: str):
+    "Record how long a one-off startup step takes."
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[step] = round(time.perf_counter() - start, 4)
+
+
+def load_env() -> None:
+    "Load .env once per process (before reading OPENAI_* settings)."
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    with _LOCK:
+        if _ENV_LOADED:
+            return
+        with timed("load_env"):
+            from dotenv import load_dotenv
+            load_dotenv()
+        _ENV_LOADED = True
+
+
+def get_openai_client():
+    """
+    Shared OpenAI client, built on first use.
+    The SDK import and client construction are paid by the first
+    request that needs them, not by every worker at boot.
+    """
+    global _CLIENT
+    if _CLIENT is not None:
+        return _CLIENT
+    with _LOCK:
+        if _CLIENT is None:
+            load_env()
+            with timed("openai_client"):
+                from openai import OpenAI
+                # Bounded timeout: resilience.py hedges and trips the breaker
+                # instead of waiting on the SDK's long default
+                _CLIENT = OpenAI(
+                    timeout=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")),
+                )
+    return _CLIENT
+
+
+def import_timed(module_name: str):
+    """
+    Import a heavy module on first use and record the import time.
+    Only modules this function finished importing take the lock-free path:
+    sys.modules also holds modules another thread is still initializing.
+    """
+    if module_name in _IMPORTED:
+        return sys.modules[module_name]
+    with _LOCK:
+        if module_name in sys.modules:
+            # Possibly still initializing elsewhere; import_module waits for it
+            module = importlib.import_module(module_name)
+        else:
+            with timed(f"import {module_name}"):
+                module = importlib.import_module(module_name)
+        _IMPORTED.add(module_name)
+    return module
+
+
+def warm_up(video: bool = True) -> dict:
+    """
+    Pay the deferred startup costs now (e.g. from a gunicorn post_fork
+    hook or a readiness probe) instead of on the first user request.
+    """
+    get_openai_client()
+    if video:
+        import_timed("video_processor")
+    return startup_report()
+
+
+def startup_report() -> dict:
+    return {
+        "env_loaded": _ENV_LOADED,
+        "openai_client_ready": _CLIENT is not None,
+        "video_ready": "video_processor" in sys.modules,
+        "timings": dict(STARTUP_TIMINGS),
+    }
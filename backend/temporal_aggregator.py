@@ -2,6 +2,8 @@ import re
 from collections import defaultdict
 from difflib import SequenceMatcher
 
+from detections import TemporalObject
+
 
 def normalize_name(name: str) -> str:
     name = name.lower()
@@ -27,16 +29,44 @@ def similar(a, b):
     return SequenceMatcher(None, a, b).ratio()
 
 
-def aggregate_temporal_objects(frame_results):
+IGNORE = {"scene", "room", "furniture"}
 
-    object_map = {}
 
-    for timestamp, objects in frame_results:
+def timestamp_seconds(timestamp) -> float | None:
+    "Frame timestamp label like '1.17s' -> 1.17"
+    try:
+        return float(str(timestamp).strip().rstrip("s"))
+    except ValueError:
+        return None
+
+
+def _seconds(timestamp) -> float:
+    return timestamp_seconds(timestamp) or 0.0
+
+
+class TemporalAggregator:
+    """
+    Incremental version of aggregate_temporal_objects.
+    Frames are fed one at a time with add_frame() (any order), which
+    reports what changed so callers can stream partial results.
+    """
+
+    def __init__(self):
+        self.object_map = {}
+
+    def add_frame(self, timestamp, objects):
+        """
+        Merge one frame's objects.
+        Returns list of updates:
+        {"event": "new" | "extended", "object": TemporalObject}
+        """
+        updates = []
+        touched = set()
         for obj in objects:
-            key = normalize_name(obj["name"])
+            key = normalize_name(obj.name)
             # try to merge with existing similar key
             matched_key = None
-            for existing_key in object_map.keys():
+            for existing_key in self.object_map.keys():
                 if similar(existing_key, key) > 0.75:
                     matched_key = existing_key
                     break
@@ -44,17 +74,35 @@ def aggregate_temporal_objects(frame_results):
             if matched_key:
                 key = matched_key
 
-            IGNORE = {"scene", "room", "furniture"}
             if key in IGNORE:
                 continue
-            if key not in object_map:
-                object_map[key] = {
-                    "name": key,
-                    "first_seen": timestamp,
-                    "last_seen": timestamp,
-                }
-            else:
-                object_map[key]["last_seen"] = timestamp
+            # Same object listed twice in one frame -> report it once
+            if key in touched:
+                continue
+            touched.add(key)
+            if key not in self.object_map:
+                self.object_map[key] = TemporalObject(key, timestamp, timestamp)
+                updates.append({"event": "new", "object": self.object_map[key].copy()})
+                continue
+            # Frames may arrive out of order (e.g. refinement frames)
+            tobj = self.object_map[key]
+            changed = False
+            if _seconds(timestamp) < _seconds(tobj.first_seen):
+                tobj.first_seen = timestamp
+                changed = True
+            if _seconds(timestamp) > _seconds(tobj.last_seen):
+                tobj.last_seen = timestamp
+                changed = True
+            if changed:
+                updates.append({"event": "extended", "object": tobj.copy()})
+        return updates
+
+    def objects(self):
+        return list(self.object_map.values())
 
-    return list(object_map.values())
 
+def aggregate_temporal_objects(frame_results):
+    aggregator = TemporalAggregator()
+    for timestamp, objects in frame_results:
+        aggregator.add_frame(timestamp, objects)
+    return aggregator.objects()
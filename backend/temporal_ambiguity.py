@@ -1,6 +1,8 @@
 def detect_temporal_ambiguity(question: str, temporal_objects: list):
     """
     Detect ambiguity across time.
+    Every temporal object becomes an option; `option_indices[i]` is the
+    index in `temporal_objects` behind `options[i]`.
     """
 
     if not temporal_objects:
@@ -17,13 +19,13 @@ def detect_temporal_ambiguity(question: str, temporal_objects: list):
     options = []
 
     for obj in temporal_objects:
-        first = obj["first_seen"]
-        last = obj["last_seen"]
+        first = obj.first_seen
+        last = obj.last_seen
 
         if first == last:
-            label = f"{obj['name']} at {first}"
+            label = f"{obj.name} at {first}"
         else:
-            label = f"{obj['name']} ({first}–{last})"
+            label = f"{obj.name} ({first}–{last})"
 
         options.append(label)
 
@@ -36,4 +38,5 @@ def detect_temporal_ambiguity(question: str, temporal_objects: list):
         "is_ambiguous": True,
         "clarifying_question": clarify_question,
         "options": options,
+        "option_indices": list(range(len(temporal_objects))),
     }
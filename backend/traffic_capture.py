@@ -0,0 +1,147 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List
+
+# Capture is off unless TRAFFIC_CAPTURE_PATH is set (one JSON record per line)
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "").strip()
+# Also keep a copy of each uploaded file as <sha256><ext>, so a trace can be
+# replayed with the original media (off by default: uploads may be private)
+TRAFFIC_CAPTURE_MEDIA_DIR = os.getenv("TRAFFIC_CAPTURE_MEDIA_DIR", "").strip()
+# Record model outputs; replay serves them instead of calling OpenAI
+TRAFFIC_CAPTURE_RESPONSES = os.getenv("TRAFFIC_CAPTURE_RESPONSES", "1").strip().lower() in ("1", "true", "yes")
+
+_CURRENT = contextvars.ContextVar("traffic_record", default=None)
+_WRITE_LOCK = threading.Lock()
+_LOG = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return bool(TRAFFIC_CAPTURE_PATH)
+
+
+def request_key(model: str, messages: List[Dict[str, Any]]) -> str:
+    """
+    Stable key of one chat completion request. The replay stand-in
+    computes it from the JSON body it receives, so a replayed call
+    gets back exactly the response recorded for it.
+    """
+    data = json.dumps([model, messages], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def file_digest(stream, block_size: int = 1024 * 1024) -> Dict[str, Any]:
+    "sha256 and size of a seekable stream; the position is restored."
+    start = stream.tell()
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+        size += len(block)
+    stream.seek(start)
+    return {"sha256": digest.hexdigest(), "size": size}
+
+
+def keep_media(path: str) -> None:
+    "Copy the current request's upload into TRAFFIC_CAPTURE_MEDIA_DIR (when set)."
+    record = _CURRENT.get()
+    if record is None or not TRAFFIC_CAPTURE_MEDIA_DIR:
+        return
+    media = record["request"].get("media") or {}
+    if not media.get("sha256"):
+        return
+    target = os.path.join(TRAFFIC_CAPTURE_MEDIA_DIR, f"{media['sha256']}{media.get('ext', '')}")
+    try:
+        os.makedirs(TRAFFIC_CAPTURE_MEDIA_DIR, exist_ok=True)
+        if not os.path.exists(target):
+            shutil.copyfile(path, target)
+    except OSError as e:
+        # Capturing must never fail the request it records
+        _LOG.warning("Could not keep media %s: %s", target, e)
+
+
+def start_record(route: str, request_fields: Dict[str, Any]) -> dict:
+    "Begin a record for the current request; model calls made on this thread join it."
+    record = {
+        "ts": round(time.time(), 3),
+        "route": route,
+        "request": request_fields,
+        "model_calls": [],
+    }
+    _CURRENT.set(record)
+    return record
+
+
+def record_model_call(model: str, messages: List[Dict[str, Any]], content: str, latency: float) -> None:
+    "Called by the OpenAI wrappers after each completion."
+    record = _CURRENT.get()
+    if record is None:
+        return
+    call = {
+        "key": request_key(model, messages),
+        "model": model,
+        "latency_ms": round(latency * 1000, 1),
+    }
+    if TRAFFIC_CAPTURE_RESPONSES:
+        call["content"] = content
+    record["model_calls"].append(call)
+
+
+def finish_record(record: dict, status: int, elapsed: float, result: Dict[str, Any] | None = None) -> None:
+    """
+    Append the finished record to the trace.
+    Errors are logged, never raised: capturing must not fail the request.
+    """
+    record["status"] = status
+    record["elapsed_ms"] = round(elapsed * 1000, 1)
+    record["result"] = result or {}
+    if _CURRENT.get() is record:
+        _CURRENT.set(None)
+    try:
+        line = json.dumps(record, ensure_ascii=False)
+        with _WRITE_LOCK:
+            directory = os.path.dirname(TRAFFIC_CAPTURE_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(TRAFFIC_CAPTURE_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except (OSError, TypeError, ValueError) as e:
+        _LOG.warning("Could not write traffic record to %s: %s", TRAFFIC_CAPTURE_PATH, e)
+
+
+def result_summary(payload: Any) -> Dict[str, Any]:
+    """
+    What a replay compares between runs: the session a clarify response
+    opened and a hash of the answer text.
+    """
+    if not isinstance(payload, dict):
+        return {}
+    summary = {}
+    if payload.get("session_id"):
+        summary["session_id"] = payload["session_id"]
+    answer = payload.get("answer")
+    if answer is None and isinstance(payload.get("result"), dict):
+        answer = payload["result"].get("answer")
+    if isinstance(answer, str):
+        summary["answer_sha1"] = hashlib.sha1(answer.encode("utf-8")).hexdigest()
+    if payload.get("error"):
+        summary["error"] = str(payload["error"])[:200]
+    return summary
+
+
+def load_trace(path: str) -> List[dict]:
+    "Records of a trace file in time order (unreadable lines are skipped)."
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    records.sort(key=lambda r: r.get("ts", 0))
+    return records
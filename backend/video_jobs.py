@@ -0,0 +1,450 @@
+import copy
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+from detections import parse_objects, to_jsonable
+
+# In-memory job table (prototype). Checkpoints on disk make jobs resumable.
+JOBS = {}
+
+BASE_DIR = os.path.dirname(__file__)
+JOBS_DIR = os.path.join(BASE_DIR, "uploads", "jobs")
+os.makedirs(JOBS_DIR, exist_ok=True)
+
+DEFAULT_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))
+# Finished jobs (with their checkpoint and video) are dropped after this long
+JOB_TTL_SECONDS = int(os.getenv("VIDEO_JOB_TTL_SECONDS", str(24 * 3600)))
+# How often idle workers look for expired jobs
+_PURGE_INTERVAL = 60.0
+# Ownership of unfinished jobs across processes (e.g. gunicorn workers):
+# <job_id>.lock holds the owner's host/pid and a lease the owner keeps renewing
+JOB_LEASE_SECONDS = float(os.getenv("VIDEO_JOB_LEASE_SECONDS", "60"))
+_HOST = socket.gethostname()
+
+_LOCK = threading.Lock()
+_CHANGED = threading.Condition(_LOCK)
+_WORKERS = []
+_START_LOCK = threading.Lock()
+_last_purge = 0.0
+# Job ids whose lease this process holds
+_OWNED = set()
+
+FINAL_STATUSES = {"done", "failed"}
+
+
+class LocalQueue:
+    """
+    In-process job queue backend.
+    Anything with the same put/get interface (e.g. a Redis list)
+    can replace it through set_queue_backend().
+    """
+
+    def __init__(self):
+        self._q = queue.Queue()
+
+    def put(self, job_id: str) -> None:
+        self._q.put(job_id)
+
+    def get(self, timeout: float = 1.0) -> str | None:
+        try:
+            return self._q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+QUEUE = LocalQueue()
+
+
+def set_queue_backend(backend) -> None:
+    global QUEUE
+    QUEUE = backend
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _checkpoint_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _lease_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.lock")
+
+
+def _lease_record() -> dict:
+    return {"host": _HOST, "pid": os.getpid(), "expires": _now() + JOB_LEASE_SECONDS}
+
+
+def _read_lease(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _owner_gone(lease: dict | None) -> bool:
+    "Lease expired, unreadable, or held by a dead process on this host."
+    if not lease or lease.get("expires", 0) < _now():
+        return True
+    if lease.get("host") != _HOST:
+        return False
+    try:
+        os.kill(lease["pid"], 0)
+    except ProcessLookupError:
+        return True
+    except (OSError, KeyError, TypeError):
+        return False
+    return False
+
+
+def _claim(job_id: str) -> bool:
+    """
+    Take ownership of a job: create its lease file exclusively, or take
+    over a lease whose owner is gone. False if a live process owns the job.
+    """
+    path = _lease_path(job_id)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            seen = _read_lease(path)
+            if not _owner_gone(seen):
+                return False
+            # Move the stale lease aside; only one process wins the rename
+            stale = f"{path}.{os.getpid()}.stale"
+            try:
+                os.rename(path, stale)
+            except OSError:
+                return False
+            taken = _read_lease(stale)
+            if taken != seen:
+                # Someone renewed or re-claimed it meanwhile: put it back
+                try:
+                    os.link(stale, path)
+                except OSError:
+                    pass
+                os.remove(stale)
+                return False
+            os.remove(stale)
+            continue
+        with os.fdopen(fd, "w") as f:
+            json.dump(_lease_record(), f)
+        with _LOCK:
+            _OWNED.add(job_id)
+        return True
+    return False
+
+
+def _release(job_id: str) -> None:
+    with _LOCK:
+        if job_id not in _OWNED:
+            return
+        _OWNED.discard(job_id)
+    try:
+        os.remove(_lease_path(job_id))
+    except OSError:
+        pass
+
+
+def _renew_leases() -> None:
+    "Push out the expiry of every lease this process holds."
+    with _LOCK:
+        owned = list(_OWNED)
+    for job_id in owned:
+        path = _lease_path(job_id)
+        lease = _read_lease(path)
+        if not lease or lease.get("host") != _HOST or lease.get("pid") != os.getpid():
+            # Lost it (e.g. the process stalled past the lease); stop renewing
+            with _LOCK:
+                _OWNED.discard(job_id)
+            continue
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_lease_record(), f)
+        os.replace(tmp_path, path)
+
+
+def _heartbeat_loop() -> None:
+    while True:
+        time.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            _renew_leases()
+        except OSError:
+            continue
+
+
+def _remove_files(job: dict) -> None:
+    for path in (_checkpoint_path(job["job_id"]), _lease_path(job["job_id"]), job.get("video_path")):
+        if not path:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _write_checkpoint(job: dict) -> None:
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    data = {k: v for k, v in job.items() if k != "events"}
+    path = _checkpoint_path(job["job_id"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=to_jsonable)
+    os.replace(tmp_path, path)
+
+
+def _emit(job: dict, event: dict) -> None:
+    # Caller holds _LOCK
+    job["events"].append(event)
+    job["updated_at"] = _now()
+    _CHANGED.notify_all()
+
+
+def create_job(data: dict) -> str:
+    """
+    Register a video job and put it on the queue.
+    `data` carries what the handler needs (video_path, question, mode).
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "created_at": _now(),
+        "updated_at": _now(),
+        "frames_total": None,
+        "frames": {},      # frame index (str) -> {timestamp, objects}
+        "result": None,
+        "status_code": None,
+        "error": None,
+        "events": [],
+        **data,
+    }
+    _claim(job_id)
+    with _LOCK:
+        JOBS[job_id] = job
+        _write_checkpoint(job)
+    QUEUE.put(job_id)
+    return job_id
+
+
+def get_job(job_id: str) -> dict | None:
+    "Snapshot of a job; `frames` is copied too, since workers keep adding to it."
+    with _LOCK:
+        job = JOBS.get(job_id)
+        if not job:
+            return None
+        snapshot = {k: v for k, v in job.items() if k not in ("events", "frames")}
+        snapshot["frames"] = copy.deepcopy(job["frames"])
+        return snapshot
+
+
+def completed_frames(job_id: str) -> dict:
+    "Checkpointed per-frame results: {index: (timestamp, objects)}"
+    with _LOCK:
+        job = JOBS.get(job_id) or {}
+        return {
+            int(i): (f["timestamp"], f["objects"])
+            for i, f in job.get("frames", {}).items()
+        }
+
+
+def set_frames_total(job_id: str, total: int, frame_plan: dict | None = None) -> None:
+    "Frame count for the base pass; `frame_plan` is kept so a resume samples the same frames."
+    with _LOCK:
+        job = JOBS[job_id]
+        job["frames_total"] = total
+        if frame_plan is not None:
+            job["frame_plan"] = frame_plan
+        _emit(job, {
+            "type": "started",
+            "frames_total": total,
+            "frames_done": len(job["frames"]),
+        })
+        _write_checkpoint(job)
+
+
+def record_frame(job_id: str, index: int, timestamp: str, objects: list) -> None:
+    "Store one frame's vision result and checkpoint it."
+    with _LOCK:
+        job = JOBS[job_id]
+        job["frames"][str(index)] = {"timestamp": timestamp, "objects": objects}
+        # Refinement frames come after the base pass
+        job["frames_total"] = max(job["frames_total"] or 0, len(job["frames"]))
+        _emit(job, {
+            "type": "frame",
+            "index": index,
+            "timestamp": timestamp,
+            "objects": objects,
+            "frames_done": len(job["frames"]),
+            "frames_total": job["frames_total"],
+        })
+        _write_checkpoint(job)
+
+
+def finish_job(job_id: str, result: dict, status_code: int = 200) -> None:
+    with _LOCK:
+        job = JOBS[job_id]
+        job["status"] = "done"
+        job["result"] = result
+        job["status_code"] = status_code
+        _emit(job, {"type": "done", "status_code": status_code, "result": result})
+        _write_checkpoint(job)
+    _release(job_id)
+
+
+def fail_job(job_id: str, error: str) -> None:
+    with _LOCK:
+        job = JOBS[job_id]
+        job["status"] = "failed"
+        job["error"] = error
+        _emit(job, {"type": "failed", "error": error})
+        _write_checkpoint(job)
+    _release(job_id)
+
+
+def purge_finished(ttl: float = JOB_TTL_SECONDS) -> int:
+    """
+    Drop jobs that finished more than `ttl` seconds ago, deleting their
+    checkpoint and the saved video. Clients should fetch results before then.
+    """
+    cutoff = _now() - ttl
+    with _LOCK:
+        expired = [
+            job for job in JOBS.values()
+            if job["status"] in FINAL_STATUSES and job["updated_at"] < cutoff
+        ]
+        for job in expired:
+            del JOBS[job["job_id"]]
+        # Wake event streams so they notice the job is gone
+        _CHANGED.notify_all()
+    for job in expired:
+        _remove_files(job)
+    return len(expired)
+
+
+def _maybe_purge() -> None:
+    global _last_purge
+    now = time.monotonic()
+    with _LOCK:
+        if now - _last_purge < _PURGE_INTERVAL:
+            return
+        _last_purge = now
+    purge_finished()
+
+
+def iter_events(job_id: str, timeout: float = 15.0):
+    """
+    Yield job events in order, blocking for new ones.
+    Yields None after `timeout` seconds without news (for keep-alives).
+    Stops after the final event.
+    """
+    cursor = 0
+    while True:
+        with _LOCK:
+            job = JOBS.get(job_id)
+            if not job:
+                return
+            if cursor >= len(job["events"]) and job["status"] not in FINAL_STATUSES:
+                _CHANGED.wait(timeout)
+            pending = job["events"][cursor:]
+            cursor += len(pending)
+            finished = job["status"] in FINAL_STATUSES
+        if not pending:
+            if finished:
+                return
+            yield None
+            continue
+        for event in pending:
+            yield event
+        if finished and cursor >= len(job["events"]):
+            return
+
+
+def _worker_loop(handler) -> None:
+    while True:
+        job_id = QUEUE.get()
+        if job_id is None:
+            _maybe_purge()
+            continue
+        with _LOCK:
+            job = JOBS.get(job_id)
+            if not job or job["status"] in FINAL_STATUSES:
+                continue
+            job["status"] = "running"
+            _write_checkpoint(job)
+        try:
+            handler(job_id)
+        except Exception as e:
+            fail_job(job_id, f"Video job failed: {str(e)}")
+
+
+def start_workers(handler, num_workers: int = DEFAULT_WORKERS) -> None:
+    """
+    Start the worker pool once per process, then queue the jobs a
+    previous process left unfinished (see resume_jobs).
+    `handler(job_id)` does the actual work and must end the job
+    with finish_job() or fail_job().
+    """
+    if _WORKERS:
+        return
+    with _START_LOCK:
+        if _WORKERS:
+            return
+        threads = []
+        for i in range(num_workers):
+            t = threading.Thread(
+                target=_worker_loop,
+                args=(handler,),
+                name=f"video-job-{i}",
+                daemon=True,
+            )
+            t.start()
+            threads.append(t)
+        threading.Thread(target=_heartbeat_loop, name="video-job-leases", daemon=True).start()
+        resume_jobs()
+        # Published last, so callers that return early see resumed jobs
+        with _LOCK:
+            _WORKERS.extend(threads)
+
+
+def resume_jobs() -> int:
+    """
+    Reload jobs from their checkpoints and queue the unfinished ones again.
+    An unfinished job is only taken over when its owner (see _claim) is
+    gone, so sibling processes never run the same job twice.
+    Frames already recorded are not re-analyzed by the handler; finished
+    jobs stay readable until purge_finished() drops them.
+    Called by start_workers().
+    """
+    resumed = 0
+    for fname in os.listdir(JOBS_DIR):
+        if not fname.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(JOBS_DIR, fname)) as f:
+                job = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        unfinished = job.get("status") not in FINAL_STATUSES
+        with _LOCK:
+            known = job.get("job_id") in JOBS
+        if known or (unfinished and not _claim(job["job_id"])):
+            continue
+        with _LOCK:
+            job["events"] = []
+            for frame in job.get("frames", {}).values():
+                frame["objects"] = parse_objects(frame["objects"])
+            if unfinished:
+                job["status"] = "queued"
+            JOBS[job["job_id"]] = job
+        if unfinished:
+            QUEUE.put(job["job_id"])
+            resumed += 1
+    return resumed
@@ -1,35 +1,138 @@
 import cv2
-import tempfile
+import numpy as np
 import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
+# Parallel segment decoding for videos that are expensive to decode
+# (duration x resolution); short or small clips decode faster inline
+DECODE_WORKERS = int(os.getenv("VIDEO_DECODE_WORKERS", str(os.cpu_count() or 1)))
+# Decode cost in megapixel-seconds (e.g. ~30 s of 720p) above which frames are split across the pool
+PARALLEL_MIN_COST = float(os.getenv("VIDEO_PARALLEL_MIN_COST", "30"))
+# Within a segment, gaps shorter than this are walked with grab() instead of a seek
+SEEK_GAP_SECONDS = float(os.getenv("VIDEO_SEEK_GAP_SECONDS", "2.0"))
 
-def extract_frames(video_bytes, max_frames=5):
-    """
-    Extract evenly spaced frames from short video.
-    Returns list of (frame_bytes, timestamp_str)
-    """
+_POOL = None
+_POOL_LOCK = threading.Lock()
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-        tmp.write(video_bytes)
-        tmp_path = tmp.name
 
-    cap = cv2.VideoCapture(tmp_path)
+def _get_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # Never fork the threaded server (locks held by other threads,
+            # OpenCV's own thread pool): start workers from a clean process
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _POOL = ProcessPoolExecutor(max_workers=DECODE_WORKERS, mp_context=context)
+        return _POOL
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-
-    if total_frames == 0 or fps == 0:
-        cap.release()
-        os.remove(tmp_path)
-        return []
 
+def _sample_indices(total_frames, fps, max_frames):
     duration = total_frames / fps
-
     frame_indices = []
     for i in range(max_frames):
         t = duration * i / max_frames
         frame_index = int(t * fps)
         frame_indices.append(frame_index)
+    return frame_indices
+
+
+def _decode_segment(video_path, shm_name, shape, slots, seek_gap):
+    """
+    Decode one segment of the timeline in a worker process.
+    - slots: list of (slot, frame_index), sorted by frame_index
+    - Decoded frames are written into the shared buffer at their slot
+    Returns the slots that were filled
+    """
+    cap = cv2.VideoCapture(video_path)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    filled = []
+    pos = None
+    try:
+        for slot, idx in slots:
+            # One seek for the segment (or a long gap), then walk forward
+            if pos is None or idx < pos or idx - pos > seek_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+                pos = idx
+            while pos < idx and cap.grab():
+                pos += 1
+            if pos != idx or not cap.grab():
+                continue
+            pos += 1
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            if frame.shape != shape[1:]:
+                frame = cv2.resize(frame, (shape[2], shape[1]))
+            out[slot] = frame
+            filled.append(slot)
+    finally:
+        del out
+        shm.close()
+        cap.release()
+    return filled
+
+
+def _extract_parallel(video_path, frame_indices, frame_shape, fps):
+    """
+    Split the sampled indices into contiguous segments, decode each
+    segment in its own process, and collect raw frames via shared memory.
+    """
+    shape = (len(frame_indices),) + frame_shape
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+    try:
+        slots = list(enumerate(frame_indices))
+        n_segments = min(DECODE_WORKERS, len(slots))
+        seg_size = -(-len(slots) // n_segments)
+        seek_gap = int(fps * SEEK_GAP_SECONDS)
+        pool = _get_pool()
+        futures = [
+            pool.submit(
+                _decode_segment, video_path, shm.name, shape,
+                slots[start:start + seg_size], seek_gap,
+            )
+            for start in range(0, len(slots), seg_size)
+        ]
+        filled = sorted(slot for f in futures for slot in f.result())
+
+        frames_raw = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        frames = []
+        for slot in filled:
+            _, buffer = cv2.imencode(".jpg", frames_raw[slot])
+            frames.append((buffer.tobytes(), f"{round(frame_indices[slot] / fps, 2)}s"))
+        del frames_raw
+        return frames
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _extract_indices(video_path, frame_indices, total_frames, fps):
+    """
+    Decode the given frame indices (in parallel segments for long or
+    high-resolution videos; each segment seeks or walks as the gaps need).
+    Returns list of (frame_bytes, timestamp_str)
+    """
+    cap = cv2.VideoCapture(video_path)
+    megapixels = cap.get(cv2.CAP_PROP_FRAME_WIDTH) * cap.get(cv2.CAP_PROP_FRAME_HEIGHT) / 1e6
+    decode_cost = total_frames / fps * megapixels
+
+    if (
+        DECODE_WORKERS > 1
+        and len(frame_indices) > 1
+        and decode_cost >= PARALLEL_MIN_COST
+    ):
+        # Probe the decoded frame shape (may differ from the reported
+        # width/height when the container carries a rotation)
+        ret, probe = cap.read()
+        cap.release()
+        if ret:
+            return _extract_parallel(video_path, frame_indices, probe.shape, fps)
+        cap = cv2.VideoCapture(video_path)
 
     frames = []
 
@@ -46,6 +149,90 @@ def extract_frames(video_bytes, max_frames=5):
         frames.append((frame_bytes, timestamp))
 
     cap.release()
-    os.remove(tmp_path)
-
     return frames
+
+
+def probe_video(video_path):
+    """
+    Basic stream info without decoding frames.
+    Returns {total_frames, fps, duration} or None if unreadable.
+    """
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if total_frames == 0 or fps == 0:
+        return None
+    return {"total_frames": total_frames, "fps": fps, "duration": total_frames / fps}
+
+
+def estimate_motion(video_path, samples=4, size=64):
+    """
+    Rough motion score in [0, 1]: mean absolute difference between a few
+    evenly spaced, downscaled grayscale frames. 0 = static scene.
+    """
+    info = probe_video(video_path)
+    if not info or samples < 2:
+        return 0.0
+    cap = cv2.VideoCapture(video_path)
+    previous = None
+    diffs = []
+    for idx in _sample_indices(info["total_frames"], info["fps"], samples):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ret, frame = cap.read()
+        if not ret:
+            continue
+        gray = cv2.cvtColor(cv2.resize(frame, (size, size)), cv2.COLOR_BGR2GRAY)
+        if previous is not None:
+            diffs.append(float(np.mean(cv2.absdiff(gray, previous))) / 255.0)
+        previous = gray
+    cap.release()
+    if not diffs:
+        return 0.0
+    # Typical handheld clips score ~0.02-0.15; stretch into [0, 1]
+    return min(1.0, 4.0 * sum(diffs) / len(diffs))
+
+
+def planned_timestamps(video_path, max_frames=5):
+    "Timestamp labels extract_frames_from_path would produce, without decoding."
+    info = probe_video(video_path)
+    if not info:
+        return []
+    return [
+        f"{round(idx / info['fps'], 2)}s"
+        for idx in _sample_indices(info["total_frames"], info["fps"], max_frames)
+    ]
+
+
+def extract_frames_from_path(video_path, max_frames=5, skip_timestamps=None):
+    """
+    Extract evenly spaced frames from a video file on disk.
+    - skip_timestamps: labels already decoded elsewhere (e.g. prefetched
+      from a partial upload); those frames are not decoded again
+    Returns list of (frame_bytes, timestamp_str)
+    """
+    info = probe_video(video_path)
+    if not info:
+        return []
+    frame_indices = _sample_indices(info["total_frames"], info["fps"], max_frames)
+    if skip_timestamps:
+        frame_indices = [
+            idx for idx in frame_indices
+            if f"{round(idx / info['fps'], 2)}s" not in skip_timestamps
+        ]
+    return _extract_indices(video_path, frame_indices, info["total_frames"], info["fps"])
+
+
+def extract_frames_at(video_path, seconds_list):
+    """
+    Extract frames at specific times (e.g. midpoints chosen by refinement).
+    Returns list of (frame_bytes, timestamp_str)
+    """
+    info = probe_video(video_path)
+    if not info:
+        return []
+    frame_indices = sorted({
+        min(info["total_frames"] - 1, max(0, int(t * info["fps"])))
+        for t in seconds_list
+    })
+    return _extract_indices(video_path, frame_indices, info["total_frames"], info["fps"])
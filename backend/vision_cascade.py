@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from ambiguity import detect_ambiguity
+from detections import DetectedObject
+from openai_vision import analyze_image_to_objects, DEFAULT_MODEL
+from startup import load_env
+
+load_env()
+
+# "off" | "video" (video frames only) | "all" (images and video frames)
+CASCADE_MODE = os.getenv("VISION_CASCADE", "off").strip().lower()
+FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4.1-mini")
+STRONG_MODEL = DEFAULT_MODEL
+
+# Words that never name the object the user is asking about
+QUESTION_STOPWORDS = {
+    "what", "which", "where", "when", "who", "whose", "how", "many", "much",
+    "is", "are", "was", "were", "do", "does", "did", "can", "could", "there",
+    "this", "that", "these", "those", "it", "its", "the", "a", "an", "of",
+    "in", "on", "at", "to", "for", "with", "and", "or", "me", "my", "you",
+    "i", "see", "tell", "describe", "picture", "image", "photo", "video",
+    "color", "colour", "number", "count", "left", "right", "middle", "top",
+    "bottom", "front", "back", "next", "near", "one", "thing", "object",
+    "objects", "here", "please", "about", "any", "all", "kind", "type",
+}
+
+_LOCK = threading.Lock()
+_LATENCIES = {FAST_MODEL: deque(maxlen=500), STRONG_MODEL: deque(maxlen=500)}
+_STATS = {"calls": 0, "escalations": 0, "reasons": {}}
+
+
+def cascade_applies(video_frame: bool) -> bool:
+    if CASCADE_MODE == "all":
+        return True
+    return CASCADE_MODE == "video" and video_frame
+
+
+def _singular(word: str) -> str:
+    if word.endswith("es") and len(word) > 4:
+        return word[:-2]
+    if word.endswith("s") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def target_nouns(question: str) -> set:
+    "Candidate object words from the question (crude noun guess)."
+    words = re.findall(r"[a-z]+", (question or "").lower())
+    return {_singular(w) for w in words if len(w) > 2 and w not in QUESTION_STOPWORDS}
+
+
+def escalation_reason(question: str, objects: List[DetectedObject]) -> str | None:
+    """
+    Confidence heuristics for the fast model's answer.
+    Returns why the strong model is needed, or None to accept it.
+    """
+    if not objects:
+        return "no_objects"
+
+    targets = target_nouns(question)
+    if targets:
+        seen = set()
+        for obj in objects:
+            seen.update(_singular(w) for w in obj.key.split())
+            seen.update(_singular(a.lower()) for a in obj.attributes)
+        if not targets & seen:
+            return "target_not_found"
+
+    # Several instances of one type -> the strong model separates them better
+    if detect_ambiguity(question, objects).get("multi_object_groups"):
+        return "multiple_same_type"
+    return None
+
+
+def _record(model: str, elapsed: float) -> None:
+    with _LOCK:
+        _LATENCIES.setdefault(model, deque(maxlen=500)).append(elapsed)
+
+
+def _percentile(values: List[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[idx], 3)
+
+
+def _timed_call(model: str, **kwargs) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        return analyze_image_to_objects(model=model, **kwargs)
+    finally:
+        _record(model, time.perf_counter() - started)
+
+
+def analyze_with_cascade(
+    image_bytes: bytes,
+    mime_type: str,
+    question: str,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Two-tier vision analysis:
+    - Run the fast model first
+    - Escalate to the strong model only if the heuristics in
+      escalation_reason() (or a JSON failure or truncated output) say the
+      answer is doubtful
+    Returns the same dict as analyze_image_to_objects, plus "model"
+    """
+    call_args = dict(image_bytes=image_bytes, mime_type=mime_type, question=question, **kwargs)
+    try:
+        parsed = _timed_call(FAST_MODEL, **call_args)
+        # Salvaged partial output is valid JSON but misses objects
+        if parsed.get("truncated"):
+            reason = "truncated"
+        else:
+            reason = escalation_reason(question, parsed.get("objects", []))
+    except ValueError:
+        parsed, reason = None, "invalid_json"
+
+    with _LOCK:
+        _STATS["calls"] += 1
+        if reason:
+            _STATS["escalations"] += 1
+            _STATS["reasons"][reason] = _STATS["reasons"].get(reason, 0) + 1
+
+    if reason is None:
+        parsed["model"] = FAST_MODEL
+        return parsed
+
+    parsed = _timed_call(STRONG_MODEL, **call_args)
+    parsed["model"] = STRONG_MODEL
+    parsed["escalation_reason"] = reason
+    return parsed
+
+
+def cascade_metrics() -> dict:
+    with _LOCK:
+        calls = _STATS["calls"]
+        tiers = {
+            model: {
+                "samples": len(values),
+                "p50_seconds": _percentile(list(values), 50),
+                "p95_seconds": _percentile(list(values), 95),
+            }
+            for model, values in _LATENCIES.items()
+        }
+        return {
+            "mode": CASCADE_MODE,
+            "fast_model": FAST_MODEL,
+            "strong_model": STRONG_MODEL,
+            "calls": calls,
+            "escalations": _STATS["escalations"],
+            "escalation_rate": round(_STATS["escalations"] / calls, 3) if calls else None,
+            "escalation_reasons": dict(_STATS["reasons"]),
+            "tiers": tiers,
+        }